@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+for module_dir in ("Deployment Files", "OCR Model"):
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, module_dir))
+
+from synthetic_corpus import load_or_generate_corpus
+
+
+class StubVisionClient:
+    # Stands in for vision.ImageAnnotatorClient so benchmarks run offline and
+    # without billing; the latency models a network round trip.
+    latency_seconds = 0.3
+    text = "Stubbed Google Vision output for benchmarking."
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def document_text_detection(self, image=None, **kwargs):
+        time.sleep(self.latency_seconds)
+        # Word annotations all sit at the top of the image, so stacked region
+        # requests attribute the stub text to the first region.
+        words = [
+            SimpleNamespace(description=word, bounding_poly=SimpleNamespace(vertices=[SimpleNamespace(y=0)]))
+            for word in self.text.split()
+        ]
+        return SimpleNamespace(
+            error=SimpleNamespace(message=""),
+            full_text_annotation=SimpleNamespace(text=self.text),
+            text_annotations=[SimpleNamespace(description=self.text)] + words,
+        )
+
+
+def install_vision_stub(latency_seconds: float):
+    from google.cloud import vision
+    StubVisionClient.latency_seconds = latency_seconds
+    vision.ImageAnnotatorClient = StubVisionClient
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile_summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "mean": 0.0, "total": 0.0}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(arr.size),
+        "p50": round(float(np.percentile(arr, 50)), 6),
+        "p95": round(float(np.percentile(arr, 95)), 6),
+        "mean": round(float(arr.mean()), 6),
+        "total": round(float(arr.sum()), 6),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def wait_for_engines() -> Dict:
+    # Engines initialize in the background; timing starts once all are loaded
+    # so runs measure steady-state throughput rather than which engines won.
+    from ocr_service import start_engines, registry
+    start_engines()
+    registry.wait_all()
+    return registry.status()
+
+
+def clear_caches():
+    # The engines' page-text caches would turn every repeat (and the first
+    # document, already seen by the warmup) into cache hits. With the
+    # endpoint runner the app shares this process's engines.
+    from ocr_service import clear_ocr_caches
+    clear_ocr_caches()
+
+
+def run_pipeline(pdf_path: str) -> List[Dict]:
+    from ocr_service import process_pdf_with_fallback
+    return process_pdf_with_fallback(pdf_path)
+
+
+def run_endpoint(pdf_path: str) -> List[Dict]:
+    from fastapi.testclient import TestClient
+    from Orchestration import app
+    with TestClient(app) as client, open(pdf_path, 'rb') as f:
+        response = client.post("/ocr", files={"file": (os.path.basename(pdf_path), f, "application/pdf")})
+    response.raise_for_status()
+    return response.json()["pages"]
+
+
+def benchmark(corpus_dir: str, seed: int, repeat: int, mode: str) -> Dict:
+    manifest = load_or_generate_corpus(corpus_dir, seed=seed)
+    runner = run_endpoint if mode == "endpoint" else run_pipeline
+
+    stage_samples = defaultdict(list)
+    documents = {}
+    total_pages = 0
+    total_seconds = 0.0
+
+    components = wait_for_engines()
+
+    # One untimed pass so model loading and lazy initialisation are excluded.
+    runner(os.path.join(corpus_dir, manifest["documents"][0]["file"]))
+
+    for document in manifest["documents"]:
+        pdf_path = os.path.join(corpus_dir, document["file"])
+        doc_seconds = []
+        engines = defaultdict(int)
+        for _ in range(repeat):
+            clear_caches()
+            start = time.perf_counter()
+            pages = runner(pdf_path)
+            elapsed = time.perf_counter() - start
+            doc_seconds.append(elapsed)
+            total_seconds += elapsed
+            total_pages += len(pages)
+            for page in pages:
+                engines[page.get("engine_used", "None")] += 1
+                for stage, seconds in (page.get("timings") or {}).items():
+                    stage_samples[stage].append(seconds)
+
+        page_count = document["variant"]["pages"]
+        documents[document["file"]] = {
+            "variant": document["variant"],
+            "seconds": percentile_summary(doc_seconds),
+            "pages_per_second": round(page_count * repeat / sum(doc_seconds), 4) if sum(doc_seconds) else 0.0,
+            "engines_used": dict(engines),
+        }
+        print(f"{document['file']}: {documents[document['file']]['pages_per_second']} pages/s, engines {dict(engines)}")
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "mode": mode,
+            "repeat": repeat,
+            "seed": seed,
+            "component_init_seconds": {name: status["seconds"] for name, status in components.items()},
+        },
+        "pages_per_second": round(total_pages / total_seconds, 4) if total_seconds else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": {stage: percentile_summary(values) for stage, values in sorted(stage_samples.items())},
+        "documents": documents,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    print(f"\n{'metric':<40}{'baseline':>12}{'current':>12}{'change':>10}")
+
+    def report(metric: str, old: float, new: float, higher_is_better: bool = False):
+        change = (new - old) / old if old else 0.0
+        print(f"{metric:<40}{old:>12.4f}{new:>12.4f}{change:>+10.1%}")
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressions.append(f"{metric}: {old:.4f} -> {new:.4f} ({change:+.1%})")
+
+    report("pages_per_second", baseline.get("pages_per_second", 0.0), current["pages_per_second"], higher_is_better=True)
+    report("peak_rss_mb", baseline.get("peak_rss_mb", 0.0), current["peak_rss_mb"])
+    for stage, summary in current["stages"].items():
+        if stage in baseline.get("stages", {}):
+            report(f"{stage}.p50", baseline["stages"][stage]["p50"], summary["p50"])
+            report(f"{stage}.p95", baseline["stages"][stage]["p95"], summary["p95"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OCR pipeline on a synthetic PDF corpus.")
+    parser.add_argument("--corpus-dir", default=os.path.join(BENCHMARK_DIR, "benchmark_corpus"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mode", choices=["pipeline", "endpoint"], default="pipeline")
+    parser.add_argument("--stub-vision", action="store_true", help="Replace the Google Vision client with an offline stub.")
+    parser.add_argument("--stub-vision-latency", type=float, default=0.3)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Baseline results file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression before failing.")
+    args = parser.parse_args()
+
+    if args.stub_vision:
+        install_vision_stub(args.stub_vision_latency)
+
+    results = benchmark(args.corpus_dir, args.seed, args.repeat, args.mode)
+    results["meta"]["vision"] = "stub" if args.stub_vision else "live"
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output} ({results['pages_per_second']} pages/s, peak RSS {results['peak_rss_mb']} MB)")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions beyond tolerance:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
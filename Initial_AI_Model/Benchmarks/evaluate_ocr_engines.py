@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+import fitz
+import numpy as np
+from PIL import Image
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+OCR_MODEL_DIR = os.path.join(PROJECT_ROOT, "OCR Model")
+sys.path.insert(0, OCR_MODEL_DIR)
+
+from synthetic_corpus import degrade_scan
+from benchmark_pipeline import install_vision_stub
+
+DEFAULT_DATASET = os.path.join(OCR_MODEL_DIR, "Dataset", "dataset.json")
+CORRECTION_CHAINS = [
+    (),
+    ("symspell",),
+    ("pyspellchecker",),
+    ("languagetool",),
+    ("symspell", "languagetool"),
+    ("pyspellchecker", "languagetool"),
+    ("symspell", "domain"),
+    ("pyspellchecker", "languagetool", "domain"),
+]
+
+
+def render_text(text: str, dpi: int, noise: float, rng: np.random.Generator) -> Image.Image:
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=220)
+    page.insert_textbox(fitz.Rect(36, 36, 559, 184), text, fontsize=12, fontname="helv")
+    pix = page.get_pixmap(dpi=dpi, colorspace="rgb", alpha=False)
+    image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    doc.close()
+    return degrade_scan(image, noise, rng).convert("RGB")
+
+
+def sample_entries(dataset_path: str, per_label: int, seed: int) -> List[Dict]:
+    from ocr_utils import load_dataset
+    by_label = defaultdict(list)
+    for entry in load_dataset(dataset_path):
+        if entry.get("text") and entry.get("label"):
+            by_label[entry["label"]].append(entry)
+    rng = random.Random(seed)
+    samples = []
+    for label in sorted(by_label):
+        entries = by_label[label]
+        samples.extend(rng.sample(entries, min(per_label, len(entries))))
+    return samples
+
+
+def build_engines(dataset_path: str, engine_names: List[str]) -> Tuple[Dict[str, Callable], Dict[str, Callable]]:
+    from spellchecker import SpellChecker
+    from ocr_utils import load_dataset, build_domain_vocabulary, enhance_spellchecker
+    from domain_postprocessor import DomainPostProcessor
+
+    vocabulary = build_domain_vocabulary(load_dataset(dataset_path))
+    spell_checker = SpellChecker()
+    enhance_spellchecker(spell_checker, vocabulary)
+
+    from easy_ocr import EasyOCREngine
+    from tesseract_ocr import TesseractEngine
+
+    # Both engines are always built: their correction methods are the SymSpell
+    # and pyspellchecker stages even when their OCR is not being evaluated.
+    easyocr_engine = EasyOCREngine(vocabulary=vocabulary, spell_checker=None)
+    tesseract_engine = TesseractEngine(vocabulary=vocabulary, spell_checker=spell_checker)
+    engines = {}
+    if "easyocr" in engine_names:
+        engines["easyocr"] = easyocr_engine.perform_ocr
+    if "tesseract" in engine_names:
+        engines["tesseract"] = tesseract_engine.run
+    if "vision" in engine_names:
+        from google_ocr import GoogleVisionEngine, OCRConfig
+        vision_engine = GoogleVisionEngine(config=OCRConfig(), vocabulary=vocabulary, spell_checker=spell_checker)
+        engines["vision"] = vision_engine.run
+
+    post_processor = DomainPostProcessor(dataset_path)
+    stages = {
+        "symspell": lambda text, label: easyocr_engine.spell_correct(text, label),
+        "pyspellchecker": lambda text, label: tesseract_engine.spell_correct(text),
+        "languagetool": lambda text, label: easyocr_engine.correct_grammar(text),
+        "domain": lambda text, label: post_processor.correct_domain_specific(text, label),
+    }
+    return engines, stages
+
+
+def pareto_front(rows: List[Dict]) -> List[Dict]:
+    front = []
+    for row in rows:
+        dominated = any(
+            other["accuracy"] >= row["accuracy"] and other["latency_ms"] <= row["latency_ms"]
+            and (other["accuracy"] > row["accuracy"] or other["latency_ms"] < row["latency_ms"])
+            for other in rows
+        )
+        if not dominated:
+            front.append(row)
+    return sorted(front, key=lambda r: r["latency_ms"])
+
+
+def evaluate(samples: List[Dict], engines: Dict[str, Callable], stages: Dict[str, Callable], dpis: List[int], noises: List[float], seed: int) -> List[Dict]:
+    from ocr_utils import calculate_levenshtein_accuracy
+
+    # (label, engine, chain, dpi) -> lists of accuracy and latency across samples and noise levels
+    accuracy = defaultdict(list)
+    latency = defaultdict(list)
+    rng = np.random.default_rng(seed)
+
+    for index, entry in enumerate(samples):
+        label, truth = entry["label"], entry["text"]
+        for dpi in dpis:
+            for noise in noises:
+                image = render_text(truth, dpi, noise, rng)
+                for engine_name, run_engine in engines.items():
+                    start = time.perf_counter()
+                    try:
+                        raw_text = run_engine(image) or ""
+                    except Exception as e:
+                        print(f"  {engine_name} failed on sample {index}: {e}")
+                        raw_text = ""
+                    ocr_seconds = time.perf_counter() - start
+
+                    for chain in CORRECTION_CHAINS:
+                        text = raw_text
+                        start = time.perf_counter()
+                        for stage in chain:
+                            try:
+                                text = stages[stage](text, label)
+                            except Exception as e:
+                                print(f"  {stage} failed on sample {index}: {e}")
+                        correction_seconds = time.perf_counter() - start
+
+                        key = (label, engine_name, "+".join(chain) or "none", dpi)
+                        accuracy[key].append(calculate_levenshtein_accuracy(text, truth))
+                        latency[key].append((ocr_seconds + correction_seconds) * 1000.0)
+        print(f"Evaluated {index + 1}/{len(samples)} samples")
+
+    rows = []
+    for key in sorted(accuracy):
+        label, engine_name, chain, dpi = key
+        rows.append({
+            "label": label,
+            "engine": engine_name,
+            "corrections": chain,
+            "dpi": dpi,
+            "accuracy": round(float(np.mean(accuracy[key])), 4),
+            "latency_ms": round(float(np.mean(latency[key])), 2),
+            "samples": len(accuracy[key]),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OCR engines and correction stages on accuracy versus latency.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--per-label", type=int, default=10)
+    parser.add_argument("--dpi", type=int, nargs="+", default=[100, 150, 200])
+    parser.add_argument("--noise", type=float, nargs="+", default=[0.0, 0.05])
+    parser.add_argument("--engines", nargs="+", default=["easyocr", "tesseract", "vision"], choices=["easyocr", "tesseract", "vision"])
+    parser.add_argument("--live-vision", action="store_true", help="Call the real Google Vision API instead of the offline stub.")
+    parser.add_argument("--min-accuracy", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="ocr_engine_evaluation.json")
+    args = parser.parse_args()
+
+    if "vision" in args.engines and not args.live_vision:
+        install_vision_stub(latency_seconds=0.3)
+
+    samples = sample_entries(args.dataset, args.per_label, args.seed)
+    engines, stages = build_engines(args.dataset, args.engines)
+    rows = evaluate(samples, engines, stages, args.dpi, args.noise, args.seed)
+
+    report = {}
+    for label in sorted({row["label"] for row in rows}):
+        label_rows = [row for row in rows if row["label"] == label]
+        front = pareto_front(label_rows)
+        meeting_bar = [row for row in label_rows if row["accuracy"] >= args.min_accuracy]
+        cheapest = min(meeting_bar, key=lambda r: r["latency_ms"]) if meeting_bar else None
+        report[label] = {"pareto": front, "cheapest_meeting_bar": cheapest}
+
+        print(f"\n=== {label} (Pareto front) ===")
+        print(f"{'engine':<12}{'corrections':<36}{'dpi':>6}{'accuracy':>10}{'ms/page':>10}")
+        for row in front:
+            print(f"{row['engine']:<12}{row['corrections']:<36}{row['dpi']:>6}{row['accuracy']:>10.4f}{row['latency_ms']:>10.1f}")
+        if cheapest:
+            print(f"Cheapest meeting {args.min_accuracy:.0%}: {cheapest['engine']} + {cheapest['corrections']} @ {cheapest['dpi']} dpi")
+        else:
+            print(f"No configuration meets {args.min_accuracy:.0%} accuracy.")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"min_accuracy": args.min_accuracy, "vision": "live" if args.live_vision else "stub", "results": rows, "labels": report}, f, indent=2)
+    print(f"\nFull results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from typing import List, Tuple
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+MODULE_DIRS = [os.path.join(PROJECT_ROOT, module_dir) for module_dir in ("Deployment Files", "OCR Model")]
+sys.path[:0] = MODULE_DIRS
+
+from resource_config import detect_cpus
+
+
+# Stands in for a fleet of OCR nodes on one machine: starts several copies of
+# the service on consecutive ports, each with its share of the cores, and
+# prints the OCR_WORKER_URLS an orchestrator needs to scatter pages over them.
+# With --pdf it instead times one document through a single worker and
+# through the whole set, each on freshly started workers.
+
+
+def start_workers(count: int, base_port: int, cpus_each: int) -> List[subprocess.Popen]:
+    env = dict(os.environ)
+    env.pop("OCR_WORKER_URLS", None)
+    env["PYTHONPATH"] = os.pathsep.join(MODULE_DIRS + [env.get("PYTHONPATH", "")]).rstrip(os.pathsep)
+    env["RESOURCE_CPUS"] = str(cpus_each)
+    return [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "Orchestration:app", "--host", "127.0.0.1", "--port", str(base_port + i)],
+            env=env, cwd=MODULE_DIRS[0],
+        )
+        for i in range(count)
+    ]
+
+
+def wait_until_ready(urls: List[str], workers: List[subprocess.Popen], timeout: float):
+    deadline = time.monotonic() + timeout
+    pending = list(urls)
+    while pending:
+        for worker in workers:
+            if worker.poll() is not None:
+                raise RuntimeError(f"A worker exited with {worker.returncode} while loading")
+        for url in list(pending):
+            try:
+                with urllib.request.urlopen(f"{url}/readyz", timeout=5) as response:
+                    if response.status == 200:
+                        pending.remove(url)
+            except (urllib.error.URLError, OSError):
+                pass
+        if pending and time.monotonic() > deadline:
+            raise RuntimeError(f"Workers not ready after {timeout}s: {pending}")
+        time.sleep(2)
+
+
+def time_document(pdf_path: str, urls: List[str]) -> dict:
+    from page_dispatch import PageDispatcher
+    dispatcher = PageDispatcher(urls)
+    start = time.perf_counter()
+    results, errors = dispatcher.dispatch_pdf(pdf_path)
+    seconds = time.perf_counter() - start
+    return {
+        "workers": len(urls),
+        "pages": len(results),
+        "page_errors": len(errors),
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(len(results) / seconds, 3) if seconds else 0.0,
+    }
+
+
+@contextmanager
+def worker_set(count: int, base_port: int, cpus_each: int, ready_timeout: float):
+    urls = [f"http://127.0.0.1:{base_port + i}" for i in range(count)]
+    workers = start_workers(count, base_port, cpus_each)
+    try:
+        wait_until_ready(urls, workers, ready_timeout)
+        yield urls, workers
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several local OCR worker services for distributed OCR.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=8101)
+    parser.add_argument("--cpus", type=int, help="Cores to split between the workers (default: detected).")
+    parser.add_argument("--ready-timeout", type=float, default=900)
+    parser.add_argument("--pdf", help="Time this document on one worker and on all of them, then stop.")
+    args = parser.parse_args()
+
+    # Every worker gets the same share, as identical nodes would.
+    cpus_each = max(1, (args.cpus or detect_cpus()[0]) // args.workers)
+    try:
+        if args.pdf:
+            # Engines cache the text of every page they have read, so each
+            # run gets its own cold workers rather than reusing warm ones.
+            with worker_set(1, args.base_port, cpus_each, args.ready_timeout) as (urls, _):
+                single = time_document(args.pdf, urls)
+            with worker_set(args.workers, args.base_port, cpus_each, args.ready_timeout) as (urls, _):
+                scattered = time_document(args.pdf, urls)
+            speedup = round(single["seconds"] / scattered["seconds"], 2) if scattered["seconds"] else None
+            print(json.dumps({"single": single, "scattered": scattered, "speedup": speedup}, indent=2))
+            return
+        with worker_set(args.workers, args.base_port, cpus_each, args.ready_timeout) as (urls, workers):
+            print(f"OCR_WORKER_URLS={','.join(urls)}", flush=True)
+            print("Workers running; Ctrl-C stops them.", flush=True)
+            for worker in workers:
+                worker.wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
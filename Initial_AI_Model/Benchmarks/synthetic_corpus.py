@@ -0,0 +1,138 @@
+import argparse
+import io
+import json
+import os
+import random
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Tuple
+
+import fitz
+import numpy as np
+from PIL import Image
+
+DEFAULT_TEXT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "OCR Model", "Dataset", "dataset.json")
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 54
+
+
+@dataclass
+class CorpusVariant:
+    name: str
+    pages: int
+    font_size: float
+    noise: float
+    image_only: bool
+    render_dpi: int = 150
+
+
+DEFAULT_VARIANTS = [
+    CorpusVariant("text_layer_small", pages=4, font_size=11, noise=0.0, image_only=False),
+    CorpusVariant("text_layer_large", pages=12, font_size=11, noise=0.0, image_only=False),
+    CorpusVariant("scan_clean", pages=4, font_size=11, noise=0.0, image_only=True),
+    CorpusVariant("scan_noisy", pages=4, font_size=11, noise=0.08, image_only=True),
+    CorpusVariant("scan_small_font", pages=4, font_size=8, noise=0.03, image_only=True),
+    CorpusVariant("scan_large_font", pages=4, font_size=16, noise=0.03, image_only=True),
+]
+
+
+def load_sentences(text_source: str) -> List[Dict[str, str]]:
+    with open(text_source, 'r', encoding='utf-8') as f:
+        return [entry for entry in json.load(f) if entry.get("text")]
+
+
+def page_text(sentences: List[Dict[str, str]], rng: random.Random, font_size: float) -> str:
+    # Roughly fill the text box: characters per line times lines per page.
+    chars_per_line = int((PAGE_WIDTH - 2 * MARGIN) / (font_size * 0.5))
+    lines = int((PAGE_HEIGHT - 2 * MARGIN) / (font_size * 1.3))
+    budget = int(chars_per_line * lines * 0.8)
+    parts = []
+    while sum(len(p) + 1 for p in parts) < budget:
+        parts.append(rng.choice(sentences)["text"])
+    return " ".join(parts)
+
+
+def degrade_scan(image: Image.Image, noise: float, rng: np.random.Generator) -> Image.Image:
+    pixels = np.asarray(image.convert("L"), dtype=np.float32)
+    if noise > 0:
+        pixels = pixels + rng.normal(0.0, 255.0 * noise, pixels.shape)
+        speckle = rng.random(pixels.shape)
+        pixels[speckle < noise / 10] = 0
+        pixels[speckle > 1 - noise / 10] = 255
+    scanned = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    if noise > 0:
+        scanned = scanned.rotate(float(rng.uniform(-1.5, 1.5)), fillcolor=255, resample=Image.BILINEAR)
+    return scanned
+
+
+def build_pdf(variant: CorpusVariant, sentences: List[Dict[str, str]], seed: int) -> Tuple[bytes, List[str]]:
+    rng = random.Random(f"{seed}:{variant.name}")
+    np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    doc = fitz.open()
+    ground_truth = []
+
+    for _ in range(variant.pages):
+        text = page_text(sentences, rng, variant.font_size)
+        ground_truth.append(text)
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_textbox(
+            fitz.Rect(MARGIN, MARGIN, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN),
+            text,
+            fontsize=variant.font_size,
+            fontname="helv",
+        )
+
+        if variant.image_only:
+            pix = page.get_pixmap(dpi=variant.render_dpi, colorspace="rgb", alpha=False)
+            rendered = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            scanned = degrade_scan(rendered, variant.noise, np_rng)
+            buffer = io.BytesIO()
+            scanned.save(buffer, format="PNG")
+            doc.delete_page(page.number)
+            image_page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            image_page.insert_image(image_page.rect, stream=buffer.getvalue())
+
+    pdf_bytes = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return pdf_bytes, ground_truth
+
+
+def generate_corpus(output_dir: str, variants: List[CorpusVariant] = None, seed: int = 42, text_source: str = DEFAULT_TEXT_SOURCE) -> Dict:
+    variants = variants or DEFAULT_VARIANTS
+    sentences = load_sentences(text_source)
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = {"seed": seed, "documents": []}
+    for variant in variants:
+        pdf_bytes, ground_truth = build_pdf(variant, sentences, seed)
+        filename = f"{variant.name}.pdf"
+        with open(os.path.join(output_dir, filename), 'wb') as f:
+            f.write(pdf_bytes)
+        manifest["documents"].append({
+            "file": filename,
+            "variant": asdict(variant),
+            "ground_truth": ground_truth,
+        })
+        print(f"Generated {filename}: {variant.pages} pages, {'image-only' if variant.image_only else 'text layer'}, noise={variant.noise}")
+
+    with open(os.path.join(output_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_or_generate_corpus(output_dir: str, seed: int = 42) -> Dict:
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("seed") == seed and all(os.path.exists(os.path.join(output_dir, d["file"])) for d in manifest["documents"]):
+            return manifest
+    return generate_corpus(output_dir, seed=seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a reproducible synthetic PDF corpus for OCR benchmarks.")
+    parser.add_argument("--output-dir", default="benchmark_corpus")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--text-source", default=DEFAULT_TEXT_SOURCE)
+    args = parser.parse_args()
+    generate_corpus(args.output_dir, seed=args.seed, text_source=args.text_source)
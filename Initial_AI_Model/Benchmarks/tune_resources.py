@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "OCR Model"))
+
+from resource_config import ENV_OVERRIDES, detect_cpus, plan_resources
+
+
+# Finds the split of this machine's cores between pre-forked OCR processes,
+# page threads per process and native threads per page that gives the most
+# pages per second, and writes it as a profile resource_config picks up.
+#
+# Thread counts are fixed once torch, OpenMP and OpenCV load, so every
+# candidate runs in fresh processes: one per OCR worker, all loaded first and
+# then released together so they compete for the cores as the server would.
+
+
+def powers_of_two(limit: int) -> List[int]:
+    values = []
+    value = 1
+    while value <= limit:
+        values.append(value)
+        value *= 2
+    if limit not in values:
+        values.append(limit)
+    return values
+
+
+def candidate_splits(ocr_cpus: int, tesseract_threads: List[int], max_processes: int) -> List[Dict[str, int]]:
+    candidates = []
+    for ocr_workers in powers_of_two(min(ocr_cpus, max_processes)):
+        per_worker = max(1, ocr_cpus // ocr_workers)
+        for page_workers in powers_of_two(per_worker):
+            per_page = max(1, per_worker // page_workers)
+            for tesseract in tesseract_threads:
+                candidates.append({
+                    "ocr_workers": ocr_workers,
+                    "page_workers": page_workers,
+                    "torch_threads": per_page,
+                    "opencv_threads": per_page,
+                    "tesseract_threads": tesseract,
+                })
+    return candidates
+
+
+def run_worker(corpus_dir: str, seed: int, repeat: int, stub_vision: float):
+    # One OCR process of a candidate. Prints "ready" once engines are loaded and
+    # warmed up, waits for "go" on stdin, then prints "result" and its JSON.
+    from benchmark_pipeline import clear_caches, install_vision_stub, wait_for_engines
+    from synthetic_corpus import load_or_generate_corpus
+    if stub_vision is not None:
+        install_vision_stub(stub_vision)
+    from page_scheduler import DocumentJob, scheduler
+
+    manifest = load_or_generate_corpus(corpus_dir, seed=seed)
+    paths = [os.path.join(corpus_dir, document["file"]) for document in manifest["documents"]]
+    wait_for_engines()
+    scheduler.run([DocumentJob("warmup", paths[0])])
+
+    print("ready", flush=True)
+    sys.stdin.readline()
+    # Each repeat starts from empty OCR caches: the warmup has already read
+    # the first document, and earlier repeats every page.
+    jobs = []
+    seconds = 0.0
+    for i in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        jobs += scheduler.run([DocumentJob(f"{os.path.basename(path)}#{i}", path) for path in paths])
+        seconds += time.perf_counter() - start
+    print("result " + json.dumps({
+        "pages": sum(len(job.results) for job in jobs),
+        "page_errors": sum(len(job.page_errors) for job in jobs),
+        "seconds": seconds,
+    }), flush=True)
+
+
+def read_line(worker: subprocess.Popen, prefix: str) -> str:
+    # Skips whatever the libraries and log handlers print in between.
+    for line in worker.stdout:
+        if line.startswith(prefix):
+            return line.strip()
+    worker.wait()
+    raise RuntimeError(f"worker exited with {worker.returncode} before '{prefix.strip()}'")
+
+
+def measure(settings: Dict[str, int], cpus: int, args) -> Dict:
+    env = dict(os.environ)
+    env.update({ENV_OVERRIDES[name]: str(value) for name, value in settings.items()})
+    env.update({"RESOURCE_CPUS": str(cpus), "OCR_PROCESS_MODEL": "prefork", "RESOURCE_PROFILE": ""})
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OMP_THREAD_LIMIT"):
+        env.pop(variable, None)
+    env.setdefault("LOG_LEVEL", "WARNING")
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--corpus-dir", args.corpus_dir,
+               "--seed", str(args.seed), "--repeat", str(args.repeat)]
+    if args.stub_vision:
+        command += ["--stub-vision", "--stub-vision-latency", str(args.stub_vision_latency)]
+
+    workers = [
+        subprocess.Popen(command, env=env, cwd=BENCHMARK_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(settings["ocr_workers"])
+    ]
+    try:
+        for worker in workers:
+            read_line(worker, "ready")
+        start = time.perf_counter()
+        for worker in workers:
+            worker.stdin.write("go\n")
+            worker.stdin.flush()
+        # Read every worker at once: a worker blocked on a full stdout pipe
+        # would stop competing for the cores.
+        with ThreadPoolExecutor(len(workers)) as pool:
+            lines = list(pool.map(lambda worker: read_line(worker, "result "), workers))
+        results = [json.loads(line[len("result "):]) for line in lines]
+        wall_seconds = time.perf_counter() - start
+    finally:
+        for worker in workers:
+            worker.kill()
+            worker.wait()
+
+    pages = sum(result["pages"] for result in results)
+    return {
+        "settings": settings,
+        "pages": pages,
+        "page_errors": sum(result["page_errors"] for result in results),
+        "wall_seconds": round(wall_seconds, 3),
+        "pages_per_second": round(pages / wall_seconds, 4) if wall_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best CPU split between OCR processes, page workers and native threads.")
+    parser.add_argument("--corpus-dir", default=os.path.join(BENCHMARK_DIR, "benchmark_corpus"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus per OCR process.")
+    parser.add_argument("--cpus", type=int, help="Tune for this many cores instead of the detected count.")
+    parser.add_argument("--max-processes", type=int, default=8, help="Upper bound on OCR processes tried (each loads every model).")
+    parser.add_argument("--tesseract-threads", type=int, nargs="+", default=[1])
+    parser.add_argument("--stub-vision", action="store_true", help="Replace the Google Vision client with an offline stub.")
+    parser.add_argument("--stub-vision-latency", type=float, default=0.3)
+    parser.add_argument("--output", default="resource_profile.json", help="Profile for RESOURCE_PROFILE.")
+    parser.add_argument("--results", default="resource_tuning.json", help="Every candidate's measurements.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.corpus_dir, args.seed, args.repeat, args.stub_vision_latency if args.stub_vision else None)
+        return
+
+    cpus, cpu_source = (args.cpus, "override") if args.cpus else detect_cpus()
+    default_plan = plan_resources(cpus, cpu_source, process_model="prefork", profile_path=None, environ={})
+    ocr_cpus = max(1, cpus - default_plan.languagetool_cpus)
+    candidates = candidate_splits(ocr_cpus, args.tesseract_threads, args.max_processes)
+    print(f"Tuning for {cpus} CPUs ({cpu_source}), {ocr_cpus} for OCR: {len(candidates)} candidate splits")
+
+    rows = []
+    for index, settings in enumerate(candidates):
+        try:
+            row = measure(settings, cpus, args)
+        except Exception as e:
+            row = {"settings": settings, "error": str(e), "pages_per_second": 0.0}
+        rows.append(row)
+        print(f"[{index + 1}/{len(candidates)}] {settings}: {row['pages_per_second']} pages/s" + (f" ({row['error']})" if "error" in row else ""))
+
+    best = max(rows, key=lambda row: row["pages_per_second"])
+    if not best["pages_per_second"]:
+        print("No candidate completed; no profile written.")
+        sys.exit(1)
+
+    with open(args.results, 'w', encoding='utf-8') as f:
+        json.dump({"cpus": cpus, "cpu_source": cpu_source, "candidates": rows}, f, indent=2)
+    profile = {
+        "cpus": cpus,
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "vision": "stub" if args.stub_vision else "live",
+        "pages_per_second": best["pages_per_second"],
+        "settings": best["settings"],
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2)
+    print(f"\nBest split {best['settings']} at {best['pages_per_second']} pages/s; profile written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+
+@dataclass
+class EnsembleMember:
+    name: str
+    model: Any
+    tokenizer: Any
+    weight: float = 1.0
+
+
+def tokenizer_family(tokenizer) -> str:
+    # Members whose tokenizers share class, vocabulary and casing produce the
+    # same input ids, so one encoding pass serves all of them.
+    vocab_size = getattr(tokenizer, "vocab_size", None)
+    lower = getattr(tokenizer, "do_lower_case", None)
+    source = getattr(tokenizer, "name_or_path", "")
+    return f"{type(tokenizer).__name__}:{vocab_size}:{lower}:{source}"
+
+
+class EnsembleEngine:
+    def __init__(
+        self,
+        members: Sequence[EnsembleMember],
+        label_names: Sequence[str],
+        device: Optional[torch.device] = None,
+        max_length: int = 512,
+        batch_size: int = 8,
+        early_exit_threshold: Optional[float] = None,
+        parallel: bool = True,
+    ):
+        self.label_names = list(label_names)
+        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.early_exit_threshold = early_exit_threshold
+        self.members = []
+        for member in sorted(members, key=lambda m: m.weight, reverse=True):
+            if member.model is None or member.tokenizer is None or member.weight <= 0:
+                continue
+            num_labels = getattr(member.model.config, "num_labels", len(self.label_names))
+            if num_labels != len(self.label_names):
+                print(f"Warning: Model {member.name} outputs {num_labels} labels, but expected {len(self.label_names)}. Skipping this model in ensemble.")
+                continue
+            member.model.eval()
+            self.members.append(member)
+
+        self._executor = None
+        if parallel and len(self.members) > 1:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.members), thread_name_prefix="ensemble")
+
+        self._stats_lock = threading.Lock()
+        self._latency = {m.name: {"calls": 0, "examples": 0, "total_ms": 0.0, "last_ms": 0.0} for m in self.members}
+        self._early_exits = 0
+        self._examples = 0
+
+    @property
+    def member_names(self) -> List[str]:
+        return [m.name for m in self.members]
+
+    def _encode(self, texts: List[str], families: Dict[str, Dict[str, List]], member: EnsembleMember):
+        family = tokenizer_family(member.tokenizer)
+        if family not in families:
+            families[family] = member.tokenizer(
+                texts, truncation=True, max_length=self.max_length, padding=False
+            )
+        return families[family]
+
+    def _run_member(self, member: EnsembleMember, encodings, indices: List[int]) -> np.ndarray:
+        start = time.perf_counter()
+        # Sorting by length keeps the padding inside each batch small.
+        order = sorted(indices, key=lambda i: len(encodings["input_ids"][i]))
+        probs = {}
+        for batch_start in range(0, len(order), self.batch_size):
+            batch_idx = order[batch_start:batch_start + self.batch_size]
+            features = [{key: encodings[key][i] for key in encodings.keys()} for i in batch_idx]
+            batch = member.tokenizer.pad(features, return_tensors="pt")
+            batch = {k: v.to(self.device) for k, v in batch.items()}
+            with torch.inference_mode():
+                logits = member.model(**batch).logits
+            batch_probs = torch.softmax(logits.float(), dim=-1).cpu().numpy()
+            for row, i in enumerate(batch_idx):
+                probs[i] = batch_probs[row]
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+        with self._stats_lock:
+            stats = self._latency[member.name]
+            stats["calls"] += 1
+            stats["examples"] += len(indices)
+            stats["total_ms"] += elapsed_ms
+            stats["last_ms"] = elapsed_ms
+        return np.stack([probs[i] for i in indices])
+
+    def predict_proba(self, texts: Sequence[str]) -> Dict[str, Any]:
+        texts = [str(t) for t in texts]
+        if not self.members:
+            raise RuntimeError("Ensemble has no usable members.")
+        if not texts:
+            return {"probabilities": np.zeros((0, len(self.label_names))), "early_exit": [], "members_used": []}
+
+        families = {}
+        all_indices = list(range(len(texts)))
+        weighted = np.zeros((len(texts), len(self.label_names)), dtype=np.float64)
+        weight_totals = np.zeros(len(texts), dtype=np.float64)
+        members_used = [[] for _ in texts]
+
+        first = self.members[0]
+        first_probs = self._run_member(first, self._encode(texts, families, first), all_indices)
+        weighted += first.weight * first_probs
+        weight_totals += first.weight
+        for i in all_indices:
+            members_used[i].append(first.name)
+
+        early_exit = [False] * len(texts)
+        remaining = all_indices
+        if self.early_exit_threshold is not None:
+            confident = first_probs.max(axis=1) >= self.early_exit_threshold
+            early_exit = confident.tolist()
+            remaining = [i for i in all_indices if not confident[i]]
+
+        others = self.members[1:]
+        if remaining and others:
+            # Encode up front so worker threads never race on the family cache.
+            encodings = {m.name: self._encode(texts, families, m) for m in others}
+            if self._executor is not None:
+                futures = [
+                    (m, self._executor.submit(self._run_member, m, encodings[m.name], remaining))
+                    for m in others
+                ]
+                results = [(m, f.result()) for m, f in futures]
+            else:
+                results = [(m, self._run_member(m, encodings[m.name], remaining)) for m in others]
+
+            for member, member_probs in results:
+                weighted[remaining] += member.weight * member_probs
+                weight_totals[remaining] += member.weight
+                for i in remaining:
+                    members_used[i].append(member.name)
+
+        with self._stats_lock:
+            self._examples += len(texts)
+            self._early_exits += sum(early_exit)
+
+        return {
+            "probabilities": weighted / weight_totals[:, None],
+            "early_exit": early_exit,
+            "members_used": members_used,
+        }
+
+    def predict(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        output = self.predict_proba(texts)
+        results = []
+        for i, probs in enumerate(output["probabilities"]):
+            pred_id = int(np.argmax(probs))
+            results.append({
+                "predicted_class": self.label_names[pred_id],
+                "confidence": float(probs[pred_id]),
+                "class_probabilities": {label: float(p) for label, p in zip(self.label_names, probs)},
+                "early_exit": output["early_exit"][i],
+                "members_used": output["members_used"][i],
+            })
+        return results
+
+    def latency_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            members = {}
+            for name, stats in self._latency.items():
+                members[name] = {
+                    **stats,
+                    "avg_ms_per_call": stats["total_ms"] / stats["calls"] if stats["calls"] else 0.0,
+                }
+            return {
+                "members": members,
+                "examples": self._examples,
+                "early_exits": self._early_exits,
+            }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,125 @@
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from nltk.stem import WordNetLemmatizer
+
+_WORD_RE = re.compile(r'\b[a-z]{2,}\b')
+_lemmatizer = None
+
+
+@lru_cache(maxsize=200000)
+def lemmatize_word(word: str) -> str:
+    global _lemmatizer
+    if _lemmatizer is None:
+        _lemmatizer = WordNetLemmatizer()
+    return _lemmatizer.lemmatize(word)
+
+
+def lemmatize_text(text: str) -> str:
+    return " ".join(lemmatize_word(word) for word in _WORD_RE.findall(text.lower()))
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+# Aho-Corasick automaton over the keyword sets of several labels: one pass over
+# the text regardless of how many keywords are compiled in. With whole_words a
+# match must sit on word boundaries, mirroring \b<keyword>\b in re.
+class KeywordMatcher:
+    def __init__(self, keyword_sets: Dict[str, Iterable[str]], whole_words: bool = True, case_sensitive: bool = False):
+        self.whole_words = whole_words
+        self.case_sensitive = case_sensitive
+        self.labels = list(keyword_sets.keys())
+
+        self.keywords: List[str] = []
+        self.keyword_labels: List[Set[str]] = []
+        keyword_ids: Dict[str, int] = {}
+        for label, keywords in keyword_sets.items():
+            for keyword in keywords:
+                keyword = self._normalize(str(keyword))
+                if not keyword:
+                    continue
+                if keyword not in keyword_ids:
+                    keyword_ids[keyword] = len(self.keywords)
+                    self.keywords.append(keyword)
+                    self.keyword_labels.append(set())
+                self.keyword_labels[keyword_ids[keyword]].add(label)
+
+        self._build()
+
+    def _normalize(self, text: str) -> str:
+        return text if self.case_sensitive else text.lower()
+
+    def _build(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+
+        for keyword_id, keyword in enumerate(self.keywords):
+            state = 0
+            for ch in keyword:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] = self._output[state] + (keyword_id,)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        text = self._normalize(text)
+        goto, fail, output = self._goto, self._fail, self._output
+        length = len(text)
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not output[state]:
+                continue
+            for keyword_id in output[state]:
+                start = end - len(self.keywords[keyword_id]) + 1
+                if self.whole_words:
+                    before = text[start - 1] if start > 0 else " "
+                    after = text[end + 1] if end + 1 < length else " "
+                    if _is_word_char(before) == _is_word_char(text[start]):
+                        continue
+                    if _is_word_char(after) == _is_word_char(text[end]):
+                        continue
+                yield keyword_id, start
+
+    def matched_keywords(self, text: str) -> Set[int]:
+        return {keyword_id for keyword_id, _ in self.iter_matches(text)}
+
+    def count_matches(self, text: str) -> Dict[str, int]:
+        counts = {label: 0 for label in self.labels}
+        for keyword_id in self.matched_keywords(text):
+            for label in self.keyword_labels[keyword_id]:
+                counts[label] += 1
+        return counts
+
+    def labels_matching(self, text: str) -> Set[str]:
+        labels = set()
+        for keyword_id in self.matched_keywords(text):
+            labels.update(self.keyword_labels[keyword_id])
+        return labels
+
+    def matches(self, text: str, label: str) -> bool:
+        return label in self.labels_matching(text)
@@ -1,20 +1,38 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 import os
-import shutil
-import tempfile
+import time
+import zipfile
 import requests
-from typing import List, Dict, Union,Optional
+from typing import Any, List, Dict, Tuple, Union,Optional
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 import io
 import sys
-print("Starting Orchestration service...")
-print(f"Python version: {sys.version}")
-print(f"Environment variables: {dict(os.environ)}")
+import logging
+from prometheus_client import Counter
+from telemetry import configure_logging, instrument_app, log_event, span
+from response_encoding import DETAIL_PATTERN, json_response, ocr_results
+from upload_spool import (
+    UPLOAD_MAX_BYTES, UploadLimitMiddleware, UploadSpool, UploadTooLarge, keep_uploads_in_memory, spool_stream, too_large
+)
+
+logger = configure_logging("orchestration")
+log_event(logger, logging.INFO, "Starting Orchestration service...", python=sys.version.split()[0])
+
+CLASSIFIER_FAILURES = Counter("classifier_call_failures_total", "Failed calls to the classification service.", ["reason"])
 
 
 try:
-    from ocr_service import process_pdf_with_fallback
+    from ocr_service import (
+        FITZ_LOCK, EnginesNotReady, process_pdf_with_fallback, process_pdf_for_classification, parse_page_range, open_pdf, classification_text,
+        start_engines, ocr_ready, component_status, engine_router, breakers, CLASSIFY_TOKEN_BUDGET, CLASSIFY_MAX_PAGES
+    )
+    from page_scheduler import DocumentJob, scheduler
+    from page_dispatch import dispatcher
+    from resource_config import RESOURCES
 except ImportError:
     raise RuntimeError(
         "Could not import 'process_pdf_with_fallback' from 'ocr_service.py'. "
@@ -22,14 +40,30 @@ except ImportError:
         "and that it has been modified as provided in the previous turn."
     )
 
+STARTED_AT = time.time()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Engines load on background threads so the port binds immediately;
+    # /readyz reports per-component progress.
+    start_engines()
+    yield
+
+
 app = FastAPI(
     title="Document Processing Orchestration Service",
     description="API for OCR and text classification of PDF documents.",
     version="0.1.0",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
 
+# Uploads are held in memory (large ones spill to a temporary file) and opened
+# with PyMuPDF directly; oversized bodies are refused while still streaming.
+keep_uploads_in_memory()
+app.add_middleware(UploadLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -37,20 +71,93 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument_app(app)
 
 CLASSIFICATION_SERVICE_URL = os.getenv("CLASSIFICATION_SERVICE_URL", "https://YOUR_CLASSIFICATION_SERVICE_CLOUD_RUN_URL/classify")
+CLASSIFICATION_BATCH_URL = os.getenv("CLASSIFICATION_BATCH_URL", CLASSIFICATION_SERVICE_URL.rsplit("/", 1)[0] + "/classify_batch")
+# Below this many words a confidence check is not worth a classifier call.
+CONFIDENCE_CHECK_MIN_WORDS = int(os.getenv("CONFIDENCE_CHECK_MIN_WORDS", "64"))
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "100"))
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "application/x-zip"}
+DETAIL_DESCRIPTION = (
+    "'full'; 'no_raw' drops each page's raw_text; 'no_page_text' also drops its corrected_text; "
+    "'summary' returns no pages or text. Responses are zstd- or gzip-compressed per Accept-Encoding."
+)
+
+def require_ocr_ready(distributed: bool = False):
+    # Distributed OCR needs a worker whose breaker is not open, not local engines.
+    if distributed:
+        if not dispatcher.available():
+            raise HTTPException(
+                status_code=503,
+                detail={"message": "No OCR worker is available.", "workers": dispatcher.snapshot()},
+                headers={"Retry-After": "10"},
+            )
+        return
+    if not ocr_ready():
+        raise engines_loading()
+
+
+def engines_loading() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail={"message": "OCR engines are still loading.", "components": component_status()},
+        headers={"Retry-After": "10"},
+    )
+
 
+@app.get("/healthz")
+async def healthz():
+    return {
+        "status": "ok",
+        "uptime_seconds": round(time.time() - STARTED_AT, 3),
+        "components": {name: status["state"] for name, status in component_status().items()},
+    }
+
+
+@app.get("/readyz")
+async def readyz():
+    components = component_status()
+    ready = ocr_ready()
+    body = {
+        "ready": ready,
+        "fully_loaded": all(status["state"] == "ready" for status in components.values()),
+        "components": components,
+        "breakers": breakers.snapshot(),
+        "resources": RESOURCES.as_dict(),
+    }
+    if dispatcher is not None:
+        body["ocr_workers"] = dispatcher.snapshot()
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.get("/routing_stats")
+async def routing_stats():
+    # Process-wide rolling engine statistics by page type (this worker only
+    # when running under the pre-fork server).
+    return engine_router.snapshot()
+
+
+# Responses are built as plain dicts and encoded by response_encoding; these
+# models document them. Text fields are left out at lower detail levels.
 class OCRPageResult(BaseModel):
     page_number: int
-    raw_text: str
-    corrected_text: str
+    raw_text: Optional[str] = None
+    corrected_text: Optional[str] = None
     engine_used: str
     grammar_issues_count: int
+    timings: Optional[Dict[str, float]] = None
+    preprocessing: Optional[Dict[str, Any]] = None
+    regions: Optional[List[Dict[str, Any]]] = None
+    routing: Optional[Dict[str, Any]] = None
+    breakers: Optional[Dict[str, str]] = None
+    boilerplate: Optional[List[str]] = None
 
 
 class OCRResponse(BaseModel):
-    pages: List[OCRPageResult]
-    total_extracted_text: str
+    page_count: Optional[int] = None
+    pages: Optional[List[OCRPageResult]] = None
+    total_extracted_text: Optional[str] = None
 
 
 class ClassificationResponse(BaseModel):
@@ -62,51 +169,227 @@ class ClassificationResponse(BaseModel):
 class OCRAndClassificationResponse(BaseModel):
     ocr_results: OCRResponse
     classification_result: ClassificationResponse
+    page_selection: Optional[Dict] = None
+
+
+class BatchDocumentResult(BaseModel):
+    filename: str
+    status: str
+    error: Optional[str] = None
+    ocr_results: Optional[OCRResponse] = None
+    classification_result: Optional[ClassificationResponse] = None
+    page_selection: Optional[Dict] = None
+    page_errors: Optional[Dict[int, str]] = None
+
+
+class BatchResponse(BaseModel):
+    documents: List[BatchDocumentResult]
+    succeeded: int
+    failed: int
+
+
+def classify_text(text: str) -> Dict:
+    log_event(logger, logging.DEBUG, "Sending extracted text to classification service", url=CLASSIFICATION_SERVICE_URL, chars=len(text))
+    
+    files = {"file": ("extracted_text.txt", io.StringIO(text), "text/plain")}
+    
+    with span("classification_call", logger=logger):
+        classification_response = requests.post(
+            CLASSIFICATION_SERVICE_URL, files=files, timeout=600
+        )
+    
+    if not classification_response.ok:
+        CLASSIFIER_FAILURES.labels("http_error").inc()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Classification service error: {classification_response.text}"
+        )
+
+    classification_result = classification_response.json()
+    
+    if not classification_result:
+        CLASSIFIER_FAILURES.labels("empty_response").inc()
+        raise HTTPException(
+            status_code=500,
+            detail="Empty response from classification service"
+        )
+    
+    log_event(logger, logging.INFO, "Classification result", predicted_class=classification_result.get("predicted_class"), confidence=classification_result.get("confidence"))
+    return classification_result
+
+
+def classify_texts(texts: List[str]) -> List[Dict]:
+    log_event(logger, logging.DEBUG, "Sending batch to classification service", url=CLASSIFICATION_BATCH_URL, documents=len(texts))
+
+    with span("classification_call", logger=logger, documents=len(texts)):
+        classification_response = requests.post(
+            CLASSIFICATION_BATCH_URL, json={"texts": texts}, timeout=600
+        )
+
+    if not classification_response.ok:
+        CLASSIFIER_FAILURES.labels("http_error").inc()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Classification service error: {classification_response.text}"
+        )
+
+    classification_results = classification_response.json().get("results") or []
+    if len(classification_results) != len(texts):
+        CLASSIFIER_FAILURES.labels("empty_response").inc()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Classification service returned {len(classification_results)} results for {len(texts)} documents"
+        )
+    return classification_results
+
+
+def classification_response(result: Dict) -> Dict:
+    # Validates the classifier's answer without keeping the model object.
+    return ClassificationResponse(**result).model_dump()
+
+
+def document_result(filename: str, status: str, error: Optional[str] = None, ocr_results: Optional[Dict] = None,
+                    classification_result: Optional[Dict] = None, page_selection: Optional[Dict] = None,
+                    page_errors: Optional[Dict[int, str]] = None) -> Dict:
+    return {
+        "filename": filename,
+        "status": status,
+        "error": error,
+        "ocr_results": ocr_results,
+        "classification_result": classification_result,
+        "page_selection": page_selection,
+        "page_errors": page_errors,
+    }
+
+
+def ocr_document(source, page_numbers: Optional[List[int]] = None) -> List[Dict]:
+    # Full-document OCR: in this process, or scattered over the OCR workers
+    # in page batches when OCR_WORKER_URLS is set.
+    if dispatcher is None:
+        return process_pdf_with_fallback(source, page_numbers)
+    page_results, page_errors = dispatcher.dispatch_pdf(source, page_numbers)
+    if page_errors:
+        raise HTTPException(
+            status_code=502,
+            detail={"message": "OCR workers failed on some pages.", "page_errors": page_errors},
+        )
+    return page_results
+
+
+def selected_pages(source, page_range: Optional[Tuple[int, Optional[int]]], max_pages: Optional[int]) -> List[int]:
+    # Opens the document for its page count, so it runs on a worker thread.
+    doc = open_pdf(source)
+    try:
+        page_count = doc.page_count
+    finally:
+        with FITZ_LOCK:
+            doc.close()
+    first, last = page_range or (1, None)
+    return list(range(first, min(last or page_count, page_count) + 1))[:max_pages]
+
+
+def receive_pdf(upload: UploadFile) -> UploadSpool:
+    # Copies the body (possibly to a spill file); callers run it in the threadpool.
+    try:
+        return spool_stream(upload.file)
+    except UploadTooLarge:
+        raise too_large(UPLOAD_MAX_BYTES, "Document")
+
+
+def collect_batch_documents(files: List[UploadFile]) -> List[Tuple[str, Optional[UploadSpool], Optional[str]]]:
+    # Returns (filename, spooled document, error) per document in upload
+    # order. ZIP members are listed as "archive.zip/member.pdf" and are size
+    # checked as they decompress. The caller closes the spools.
+    documents = []
+
+    def add(filename: str, source) -> None:
+        try:
+            documents.append((filename, spool_stream(source), None))
+        except UploadTooLarge as e:
+            documents.append((filename, None, str(e)))
+
+    try:
+        for upload in files:
+            filename = upload.filename or "upload"
+            lowered = filename.lower()
+            if upload.content_type == "application/pdf" or lowered.endswith(".pdf"):
+                add(filename, upload.file)
+            elif upload.content_type in ZIP_CONTENT_TYPES or lowered.endswith(".zip"):
+                try:
+                    with zipfile.ZipFile(upload.file) as archive:
+                        for member in archive.infolist():
+                            if member.is_dir() or not member.filename.lower().endswith(".pdf"):
+                                continue
+                            with archive.open(member) as source:
+                                add(f"{filename}/{member.filename}", source)
+                except zipfile.BadZipFile as e:
+                    documents.append((filename, None, f"Invalid ZIP archive: {e}"))
+            else:
+                documents.append((filename, None, "Only PDF files (.pdf) or ZIP archives of PDFs are accepted."))
+            if len(documents) > BATCH_MAX_DOCUMENTS:
+                raise HTTPException(
+                    status_code=400, detail=f"A batch may contain at most {BATCH_MAX_DOCUMENTS} documents."
+                )
+    except BaseException:
+        for _, spool, _ in documents:
+            if spool is not None:
+                spool.close()
+        raise
+    return documents
+
+
+def open_batch_jobs(documents: List[Tuple[str, Optional[UploadSpool], Optional[str]]], mode: str, token_budget: int,
+                    max_pages: Optional[int]) -> Tuple[List[Optional[Dict]], List[Tuple[int, DocumentJob]]]:
+    # A scheduler job per readable document; the rest get their failed result.
+    results: List[Optional[Dict]] = [None] * len(documents)
+    jobs: List[Tuple[int, DocumentJob]] = []
+    for index, (filename, spool, error) in enumerate(documents):
+        if error is None:
+            try:
+                jobs.append((index, DocumentJob(filename, spool.source(), mode=mode, token_budget=token_budget, max_pages=max_pages)))
+                continue
+            except Exception as e:
+                error = f"Could not open PDF: {e}"
+        results[index] = document_result(filename, "failed", error)
+    return results, jobs
 
 
 @app.post("/ocr", response_model=OCRResponse, summary="Process Document Only OCR")
 async def process_document_only_ocr(
-    file: UploadFile = File(..., media_type="application/pdf")
+    request: Request,
+    file: UploadFile = File(..., media_type="application/pdf"),
+    detail: str = Query("full", pattern=DETAIL_PATTERN, description=DETAIL_DESCRIPTION),
 ):
     if file.content_type != "application/pdf":
         raise HTTPException(
             status_code=400, detail="Only PDF files (.pdf) are accepted."
         )
-
-    temp_dir = tempfile.mkdtemp()
-    temp_pdf_path = os.path.join(temp_dir, file.filename)
+    require_ocr_ready(distributed=dispatcher is not None)
+    upload = await run_in_threadpool(receive_pdf, file)
 
     try:
-        with open(temp_pdf_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        temp_output_dir = os.path.join(temp_dir, "output")
-        os.makedirs(temp_output_dir, exist_ok=True)
-
-        ocr_page_results = process_pdf_with_fallback(temp_pdf_path, temp_output_dir)
+        with span("ocr_document", logger=logger, filename=file.filename, bytes=upload.size, spilled=upload.spilled):
+            ocr_page_results = await run_in_threadpool(ocr_document, upload.source())
 
         total_extracted_text = "\n".join(
             [page["corrected_text"] for page in ocr_page_results]
         )
 
-        formatted_ocr_page_results = [
-            OCRPageResult(**res) for res in ocr_page_results
-        ]
-
-        return OCRResponse(
-            pages=formatted_ocr_page_results,
-            total_extracted_text=total_extracted_text,
-        )
+        return await json_response(request, ocr_results(ocr_page_results, total_extracted_text, detail), detail)
 
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=f"File error: {e}")
+    except EnginesNotReady:
+        # Engines went away (or never came up) after the readiness check.
+        raise engines_loading()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"An unexpected error occurred during OCR: {e}"
         )
     finally:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        upload.close()
 
 
 @app.post(
@@ -116,26 +399,55 @@ async def process_document_only_ocr(
     description="Endpoint to perform OCR and then classify the extracted text.",
 )
 async def process_document_and_classify(
-    file: UploadFile = File(..., media_type="application/pdf")
+    request: Request,
+    file: UploadFile = File(..., media_type="application/pdf"),
+    mode: str = Query("full", pattern="^(full|classify)$", description="'classify' OCRs only the pages needed to classify."),
+    page_range: Optional[str] = Query(None, description="1-based inclusive pages, e.g. '5-40', '5-' or '12'."),
+    max_pages: Optional[int] = Query(None, ge=1),
+    token_budget: int = Query(CLASSIFY_TOKEN_BUDGET, ge=1, description="Classify mode: stop once this many words are extracted."),
+    min_confidence: Optional[float] = Query(None, gt=0, le=1, description="Classify mode: stop once the classifier is this confident."),
+    detail: str = Query("full", pattern=DETAIL_PATTERN, description=DETAIL_DESCRIPTION),
 ):
     if file.content_type != "application/pdf":
         raise HTTPException(
             status_code=400, detail="Only PDF files (.pdf) are accepted."
         )
-
-    temp_dir = tempfile.mkdtemp()
-    temp_pdf_path = os.path.join(temp_dir, file.filename)
+    try:
+        parsed_range = parse_page_range(page_range) if page_range else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    require_ocr_ready(distributed=dispatcher is not None and mode == "full")
+    upload = await run_in_threadpool(receive_pdf, file)
 
     try:
-        with open(temp_pdf_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        page_selection = None
+        last_classification = {}
 
-        temp_output_dir = os.path.join(temp_dir, "output")
-        os.makedirs(temp_output_dir, exist_ok=True)
+        def confident_enough(text: str) -> bool:
+            if len(text.split()) < CONFIDENCE_CHECK_MIN_WORDS:
+                return False
+            last_classification["text"] = text
+            last_classification["result"] = classify_text(text)
+            return (last_classification["result"].get("confidence") or 0.0) >= min_confidence
 
-        print("Performing OCR...")
         try:
-            ocr_page_results = process_pdf_with_fallback(temp_pdf_path, temp_output_dir)
+            with span("ocr_document", logger=logger, filename=file.filename, mode=mode, bytes=upload.size, spilled=upload.spilled):
+                if mode == "classify":
+                    ocr_page_results, page_selection = await run_in_threadpool(
+                        process_pdf_for_classification,
+                        upload.source(),
+                        token_budget=token_budget,
+                        page_range=parsed_range,
+                        max_pages=max_pages or CLASSIFY_MAX_PAGES,
+                        stop_when=confident_enough if min_confidence else None,
+                    )
+                else:
+                    page_numbers = None
+                    if parsed_range or max_pages:
+                        page_numbers = await run_in_threadpool(selected_pages, upload.source(), parsed_range, max_pages)
+                        if not page_numbers:
+                            raise ValueError(f"Page range '{page_range}' is outside the document")
+                    ocr_page_results = await run_in_threadpool(ocr_document, upload.source(), page_numbers)
         except ValueError as e:
             raise HTTPException(
                 status_code=400,
@@ -151,59 +463,37 @@ async def process_document_and_classify(
                 status_code=400, detail="No text extracted from the PDF after OCR."
             )
 
-        formatted_ocr_page_results = [
-            OCRPageResult(**res) for res in ocr_page_results
-        ]
-        ocr_response = OCRResponse(
-            pages=formatted_ocr_page_results,
-            total_extracted_text=total_extracted_text,
-        )
-
-        print(f"Sending extracted text to classification service at {CLASSIFICATION_SERVICE_URL}...")
-        
-        files = {"file": ("extracted_text.txt", io.StringIO(total_extracted_text), "text/plain")}
-        
-        classification_response = requests.post(
-            CLASSIFICATION_SERVICE_URL, files=files, timeout=600
-        )
-        
-        if not classification_response.ok:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Classification service error: {classification_response.text}"
-            )
-
-        classification_result = classification_response.json()
-        
-        if not classification_result:
-            raise HTTPException(
-                status_code=500,
-                detail="Empty response from classification service"
-            )
-        
-        print(f"Classification result: {classification_result}")
-        
-        parsed_classification_result = ClassificationResponse(**classification_result)
+        # The confidence check may already have classified exactly this text.
+        document_text = classification_text(ocr_page_results)
+        if last_classification.get("text") == document_text:
+            classification_result = last_classification["result"]
+        else:
+            classification_result = classify_text(document_text)
 
-        return OCRAndClassificationResponse(
-            ocr_results=ocr_response,
-            classification_result=parsed_classification_result,
-        )
+        return await json_response(request, {
+            "ocr_results": ocr_results(ocr_page_results, total_extracted_text, detail),
+            "classification_result": classification_response(classification_result),
+            "page_selection": page_selection,
+        }, detail)
 
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=f"File error: {e}")
     except requests.exceptions.Timeout:
+        CLASSIFIER_FAILURES.labels("timeout").inc()
         raise HTTPException(
             status_code=504,
             detail="Classification service timeout"
         )
     except requests.exceptions.RequestException as e:
+        CLASSIFIER_FAILURES.labels("connection").inc()
         error_detail = f"Failed to connect to classification service or received an error: {e}"
         if e.response is not None:
             error_detail += f" - Response: {e.response.text}"
         raise HTTPException(
             status_code=500, detail=f"Classification error: {error_detail}"
         )
+    except EnginesNotReady:
+        raise engines_loading()
     except HTTPException:
         raise
     except Exception as e:
@@ -212,8 +502,128 @@ async def process_document_and_classify(
             detail=f"An unexpected error occurred during OCR and classification: {e}",
         )
     finally:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        upload.close()
+
+
+@app.post(
+    "/ocr_pages",
+    summary="OCR A Page Batch For A Dispatching Orchestrator",
+    description="Worker side of distributed OCR: OCRs every page of the uploaded PDF, a batch cut from a larger document.",
+)
+async def process_page_batch(
+    request: Request,
+    file: UploadFile = File(..., media_type="application/pdf"),
+    pages: Optional[str] = Query(None, description="The uploaded pages' numbers in the original document, comma-separated."),
+):
+    try:
+        page_numbers = [int(page_number) for page_number in pages.split(",")] if pages else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid page numbers '{pages}'.")
+    require_ocr_ready()
+    upload = await run_in_threadpool(receive_pdf, file)
+    try:
+        try:
+            job = DocumentJob(file.filename or "pages", upload.source())
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not open page batch: {e}")
+        page_numbers = page_numbers or list(range(1, job.page_count + 1))
+        if len(page_numbers) != job.page_count:
+            job.finish()
+            raise HTTPException(status_code=400, detail=f"{len(page_numbers)} page numbers given for {job.page_count} pages.")
+
+        # Pages of concurrent batches share the scheduler's workers.
+        with span("ocr_pages", logger=logger, pages=job.page_count):
+            await run_in_threadpool(scheduler.run, [job])
+        return await json_response(request, {
+            "pages": [dict(result, page_number=page_numbers[result["page_number"] - 1]) for result in job.results],
+            "page_errors": {page_numbers[page_number - 1]: error for page_number, error in job.page_errors.items()},
+        })
+    finally:
+        upload.close()
+
+
+@app.post(
+    "/ocr_and_classify_batch",
+    response_model=BatchResponse,
+    summary="Process And Classify Several Documents",
+    description="OCR several PDFs (or ZIP archives of PDFs) on the shared page workers, then classify them in one call.",
+)
+async def process_documents_and_classify(
+    request: Request,
+    files: List[UploadFile] = File(..., description="PDF files and/or ZIP archives containing PDFs."),
+    mode: str = Query("full", pattern="^(full|classify)$", description="'classify' OCRs only the pages needed to classify."),
+    max_pages: Optional[int] = Query(None, ge=1),
+    token_budget: int = Query(CLASSIFY_TOKEN_BUDGET, ge=1, description="Classify mode: stop once this many words are extracted."),
+    detail: str = Query("full", pattern=DETAIL_PATTERN, description=DETAIL_DESCRIPTION),
+):
+    require_ocr_ready()
+
+    # Reading, unzipping and opening the uploads all block.
+    documents = await run_in_threadpool(collect_batch_documents, files)
+    try:
+        if not documents:
+            raise HTTPException(status_code=400, detail="No PDF documents found in the upload.")
+
+        results, jobs = await run_in_threadpool(open_batch_jobs, documents, mode, token_budget, max_pages)
+
+        # Pages of every document share the scheduler's workers; waiting
+        # happens off the event loop.
+        with span("ocr_batch", logger=logger, documents=len(jobs), mode=mode):
+            await run_in_threadpool(scheduler.run, [job for _, job in jobs])
+
+        extracted = []
+        for index, job in jobs:
+            total_extracted_text = "\n".join(page["corrected_text"] for page in job.results)
+            if not total_extracted_text.strip():
+                results[index] = document_result(
+                    job.name, "failed", "No text extracted from the PDF after OCR.", page_errors=job.page_errors or None,
+                )
+                continue
+            ocr_response = ocr_results(job.results, total_extracted_text, detail)
+            extracted.append((index, job, ocr_response, classification_text(job.results)))
+
+        classification_results = []
+        classification_error = None
+        if extracted:
+            try:
+                classification_results = await run_in_threadpool(
+                    classify_texts, [document_text for _, _, _, document_text in extracted]
+                )
+            except HTTPException as e:
+                classification_error = f"Classification error: {e.detail}"
+            except requests.exceptions.Timeout:
+                CLASSIFIER_FAILURES.labels("timeout").inc()
+                classification_error = "Classification service timeout"
+            except requests.exceptions.RequestException as e:
+                CLASSIFIER_FAILURES.labels("connection").inc()
+                classification_error = f"Failed to connect to classification service: {e}"
+
+        for position, (index, job, ocr_response, _) in enumerate(extracted):
+            results[index] = document_result(
+                job.name,
+                "failed" if classification_error else "ok",
+                classification_error,
+                ocr_results=ocr_response,
+                classification_result=None if classification_error else classification_response(classification_results[position]),
+                page_selection=job.selection(),
+                page_errors=job.page_errors or None,
+            )
+
+        succeeded = sum(1 for result in results if result["status"] == "ok")
+        log_event(logger, logging.INFO, "Batch processed", documents=len(results), succeeded=succeeded, mode=mode)
+        return await json_response(request, {"documents": results, "succeeded": succeeded, "failed": len(results) - succeeded}, detail)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred during batch processing: {e}",
+        )
+    finally:
+        for _, spool, _ in documents:
+            if spool is not None:
+                spool.close()
 
 
 if __name__ == "__main__":
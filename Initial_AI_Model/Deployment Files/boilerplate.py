@@ -0,0 +1,146 @@
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Set, Tuple
+
+from prometheus_client import Counter
+
+# A line at the top or bottom of this many pages of one document is a running
+# header, footer, page number or copyright line.
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+# Lines from each end of a page that may be boilerplate.
+BOILERPLATE_ZONE_LINES = int(os.getenv("BOILERPLATE_ZONE_LINES", "2"))
+# Longer lines are body text even when they repeat.
+BOILERPLATE_MAX_CHARS = int(os.getenv("BOILERPLATE_MAX_CHARS", "120"))
+BOILERPLATE_ENABLED = os.getenv("BOILERPLATE_ENABLED", "1") == "1"
+# Leave repeated lines out of the text sent to the classifier.
+BOILERPLATE_STRIP_FOR_CLASSIFICATION = os.getenv("BOILERPLATE_STRIP_FOR_CLASSIFICATION", "1") == "1"
+
+BOILERPLATE_LINES = Counter("ocr_boilerplate_lines_total", "Repeated header/footer lines by how they were corrected.", ["outcome"])
+
+_DIGITS_RE = re.compile(r"\d+")
+_PUNCTUATION_RE = re.compile(r"[^\w#]+")
+_ROMAN_RE = re.compile(r"^[ivxlcdm]+$")
+
+# (region index, line index within the region, line)
+Line = Tuple[int, int, str]
+
+
+def normalize_line(line: str) -> str:
+    # Page numbers change from page to page; the rest of a running header does not.
+    key = _PUNCTUATION_RE.sub(" ", _DIGITS_RE.sub("#", line.lower())).strip()
+    return "#" if _ROMAN_RE.match(key) else key
+
+
+def _zones(lines: List[Line]) -> Tuple[List[Line], List[Line]]:
+    content = [line for line in lines if line[2].strip()]
+    top = content[:BOILERPLATE_ZONE_LINES]
+    bottom = content[max(len(top), len(content) - BOILERPLATE_ZONE_LINES):]
+    return top, bottom
+
+
+def split_lines(texts: List[str]) -> List[Line]:
+    return [(index, number, line) for index, text in enumerate(texts) for number, line in enumerate(text.split("\n"))]
+
+
+# Per-document record of which normalized lines appeared at which end of
+# which pages, plus the corrections already made for the repeated ones.
+class BoilerplateTracker:
+    def __init__(self, min_pages: int = BOILERPLATE_MIN_PAGES):
+        self.min_pages = min_pages
+        self._pages: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+        self._corrections: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.corrected = 0
+
+    def observe(self, page_number: int, lines: List[Line]):
+        top, bottom = _zones(lines)
+        with self._lock:
+            for zone, zone_lines in (("top", top), ("bottom", bottom)):
+                for _, _, line in zone_lines:
+                    if len(line) <= BOILERPLATE_MAX_CHARS:
+                        key = normalize_line(line)
+                        if key:
+                            self._pages[(zone, key)].add(page_number)
+
+    def _repeated(self, zone: str, line: str) -> bool:
+        if len(line) > BOILERPLATE_MAX_CHARS:
+            return False
+        key = normalize_line(line)
+        return bool(key) and len(self._pages.get((zone, key), ())) >= self.min_pages
+
+    def split(self, lines: List[Line]) -> Tuple[List[Line], List[Line]]:
+        # The runs of repeated lines at the top and bottom of a page; a
+        # repeated line below the first body line stays in the body.
+        top, bottom = _zones(lines)
+        header, footer = [], []
+        with self._lock:
+            for line in top:
+                if not self._repeated("top", line[2]):
+                    break
+                header.append(line)
+            for line in reversed(bottom):
+                if not self._repeated("bottom", line[2]):
+                    break
+                footer.insert(0, line)
+        return header, footer
+
+    def trim(self, page_number: int, texts: List[str]) -> Tuple[List[Line], List[str], List[Line]]:
+        # Records this page, then returns its header lines, the texts with
+        # header and footer removed, and its footer lines.
+        lines = split_lines(texts)
+        self.observe(page_number, lines)
+        header, footer = self.split(lines)
+        return header, remove_lines(texts, header + footer), footer
+
+    def correct(self, line: str, correct: Callable[[str], str]) -> str:
+        # Corrects each distinct line once per document. Digits are masked so
+        # "Chapter 3 ... 41" and "Chapter 3 ... 42" share one correction.
+        if not any(c.isalpha() for c in line):
+            return line
+        digits = _DIGITS_RE.findall(line)
+        template = _DIGITS_RE.sub("0", line)
+        with self._lock:
+            corrected = self._corrections.get(template)
+        if corrected is None:
+            corrected = correct(template)
+            with self._lock:
+                self._corrections[template] = corrected
+                self.corrected += 1
+            BOILERPLATE_LINES.labels("corrected").inc()
+        else:
+            with self._lock:
+                self.reused += 1
+            BOILERPLATE_LINES.labels("reused").inc()
+        if len(_DIGITS_RE.findall(corrected)) != len(digits):
+            # The correction moved or dropped a number; this line needs its own.
+            return correct(line)
+        values = iter(digits)
+        return _DIGITS_RE.sub(lambda _: next(values), corrected)
+
+
+def remove_lines(texts: List[str], lines: List[Line]) -> List[str]:
+    drop = {(index, number) for index, number, _ in lines}
+    if not drop:
+        return list(texts)
+    return [
+        "\n".join(line for number, line in enumerate(text.split("\n")) if (index, number) not in drop).strip("\n")
+        for index, text in enumerate(texts)
+    ]
+
+
+def strip_boilerplate(texts: List[str], min_pages: int = BOILERPLATE_MIN_PAGES) -> List[str]:
+    # Document-level pass over finished pages (in page order): drops the
+    # repeated header and footer lines, including those on pages processed
+    # before the repetition was known.
+    tracker = BoilerplateTracker(min_pages)
+    pages = [split_lines([text]) for text in texts]
+    for page_number, lines in enumerate(pages):
+        tracker.observe(page_number, lines)
+    stripped = []
+    for text, lines in zip(texts, pages):
+        header, footer = tracker.split(lines)
+        stripped.append(remove_lines([text], header + footer)[0])
+    return stripped
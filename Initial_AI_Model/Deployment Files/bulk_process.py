@@ -0,0 +1,264 @@
+import argparse
+import functools
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional, Set
+
+# One OCR process per core, each working through whole documents; the plan
+# (and the native thread limits it exports) must load before torch.
+os.environ.setdefault("OCR_PROCESS_MODEL", "prefork")
+from resource_config import RESOURCES
+
+from telemetry import configure_logging, log_event
+import ocr_service
+
+logger = configure_logging("bulk_process")
+
+BULK_ENGINE_TIMEOUT = float(os.getenv("BULK_ENGINE_TIMEOUT", "900"))
+BULK_REPORT_SECONDS = float(os.getenv("BULK_REPORT_SECONDS", "30"))
+
+# Offline backfills: OCR (and classify) every PDF under a directory or in a
+# manifest without going through the HTTP API. Engines load once in the
+# parent and are shared copy-on-write by a pool of forked workers, as under
+# prefork_server.py; each worker takes whole documents. Results are appended
+# to a JSONL file as documents finish, and a rerun with the same output
+# skips every document already in it.
+
+
+def find_documents(source: str) -> List[str]:
+    # A directory (searched recursively for PDFs), a JSONL manifest with a
+    # "path" per line, or a text file with one path per line. Relative
+    # manifest paths are relative to the manifest.
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+            if name.lower().endswith(".pdf")
+        )
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if line.startswith("{") else line
+            paths.append(os.path.join(base, path))
+    return paths
+
+
+def completed_documents(output: str, retry_failed: bool) -> Set[str]:
+    # The output file is the checkpoint. A run killed mid-write can leave a
+    # partial last line; it is cut off so new records start on a line of their own.
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    for line in data[:end].splitlines():
+        record = json.loads(line)
+        if record["status"] == "ok" or not retry_failed:
+            done.add(record["path"])
+    return done
+
+
+def init_worker():
+    # Ctrl-C is handled by the parent, which terminates the pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ocr_service.after_fork()
+    import torch
+    torch.set_num_threads(RESOURCES.torch_threads)
+
+
+def process_document(path: str, mode: str, include_pages: bool) -> Dict:
+    started = time.perf_counter()
+    record = {"path": path, "pid": os.getpid()}
+    try:
+        if mode == "classify":
+            page_results, selection = ocr_service.process_pdf_for_classification(path)
+            record["page_selection"] = selection
+        else:
+            page_results = ocr_service.process_pdf_with_fallback(path)
+        total_extracted_text = "\n".join(page["corrected_text"] for page in page_results)
+        if not total_extracted_text.strip():
+            raise ValueError("No text extracted from the PDF after OCR.")
+        record.update(
+            status="ok",
+            pages=len(page_results),
+            total_extracted_text=total_extracted_text,
+            classification_text=ocr_service.classification_text(page_results),
+        )
+        if include_pages:
+            record["page_results"] = page_results
+    except Exception as e:
+        record.update(status="failed", pages=0, error=str(e))
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+class LocalClassifier:
+    # The classification service's model, loaded in this process; texts are
+    # classified in batches as documents finish.
+    def __init__(self, batch_size: int):
+        import classification_service
+        self.service = classification_service
+        self.batch_size = batch_size
+        classification_service.initialize_service()
+        if not classification_service.service_state["ready"]:
+            raise RuntimeError(f"Classifier failed to load: {classification_service.service_state['error']}")
+
+    def classify(self, texts: List[str]) -> List[Dict]:
+        predictions = self.service.ensemble_engine.predict(texts)
+        return [
+            {key: prediction[key] for key in ("predicted_class", "confidence", "class_probabilities")}
+            for prediction in predictions
+        ]
+
+
+class ResultWriter:
+    def __init__(self, output: str, classifier: Optional[LocalClassifier]):
+        self.file = open(output, "a", encoding="utf-8")
+        self.classifier = classifier
+        self.pending: List[Dict] = []
+        self.documents = self.failed = self.pages = 0
+
+    def add(self, record: Dict):
+        if self.classifier is not None and record["status"] == "ok":
+            self.pending.append(record)
+            if len(self.pending) >= self.classifier.batch_size:
+                self.flush()
+        else:
+            self._write(record)
+
+    def flush(self):
+        records, self.pending = self.pending, []
+        if not records:
+            return
+        try:
+            results = self.classifier.classify([record.pop("classification_text") for record in records])
+            for record, result in zip(records, results):
+                record["classification_result"] = result
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Classification failed", documents=len(records), error=str(e))
+            for record in records:
+                record.update(status="failed", error=f"Classification error: {e}")
+        for record in records:
+            self._write(record)
+
+    def _write(self, record: Dict):
+        record.pop("classification_text", None)
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.documents += 1
+        self.failed += record["status"] != "ok"
+        self.pages += record["pages"]
+
+    def close(self):
+        self.file.close()
+
+
+class Throughput:
+    def __init__(self, total: int):
+        self.total = total
+        self.started = time.perf_counter()
+        self.last_report = self.started
+
+    def summary(self, writer: ResultWriter) -> Dict:
+        seconds = time.perf_counter() - self.started
+        summary = {
+            "documents": writer.documents,
+            "remaining": self.total - writer.documents,
+            "failed": writer.failed,
+            "pages": writer.pages,
+            "seconds": round(seconds, 1),
+            "documents_per_second": round(writer.documents / seconds, 3) if seconds else 0.0,
+            "pages_per_second": round(writer.pages / seconds, 3) if seconds else 0.0,
+        }
+        if writer.documents and summary["remaining"]:
+            summary["eta_seconds"] = round(seconds / writer.documents * summary["remaining"])
+        return summary
+
+    def maybe_report(self, writer: ResultWriter):
+        now = time.perf_counter()
+        if now - self.last_report >= BULK_REPORT_SECONDS:
+            self.last_report = now
+            log_event(logger, logging.INFO, "Bulk progress", **self.summary(writer))
+
+
+def load_engines():
+    ocr_service.start_engines()
+    if not ocr_service.registry.wait_all(timeout=BULK_ENGINE_TIMEOUT):
+        unsettled = ocr_service.registry.unsettled()
+        if unsettled:
+            # As in prefork_server: never fork with loader threads still running.
+            raise RuntimeError(f"Engines still loading after {BULK_ENGINE_TIMEOUT}s: {unsettled}")
+        log_event(logger, logging.WARNING, "Not every engine loaded", components=ocr_service.component_status())
+    # Same as prefork_server: keep the workers' collectors off the parent's pages.
+    gc.collect()
+    gc.freeze()
+
+
+def run(paths: List[str], args) -> Dict:
+    load_engines()
+    context = multiprocessing.get_context("fork")
+    task = functools.partial(process_document, mode=args.mode, include_pages=args.include_pages)
+    with context.Pool(args.workers, initializer=init_worker) as pool:
+        # Forked before the classifier loads, so the workers do not carry it.
+        classifier = LocalClassifier(args.classify_batch_size) if args.classify else None
+        writer = ResultWriter(args.output, classifier)
+        throughput = Throughput(len(paths))
+        try:
+            for record in pool.imap_unordered(task, paths):
+                writer.add(record)
+                throughput.maybe_report(writer)
+            writer.flush()
+        except KeyboardInterrupt:
+            # Unwritten documents are simply redone by the next run.
+            pool.terminate()
+            log_event(logger, logging.WARNING, "Interrupted; rerun with the same output to resume", **throughput.summary(writer))
+            raise
+        finally:
+            writer.close()
+    return throughput.summary(writer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR and classify a directory or manifest of PDFs without the HTTP API.")
+    parser.add_argument("source", help="Directory of PDFs, JSONL manifest with a 'path' per line, or a file of paths.")
+    parser.add_argument("--output", default="bulk_results.jsonl", help="JSONL results, appended to; also the resume checkpoint.")
+    parser.add_argument("--mode", choices=["full", "classify"], default="full", help="OCR every page, or only what classification needs.")
+    parser.add_argument("--workers", type=int, default=RESOURCES.ocr_workers, help="OCR processes (default: the resource plan's).")
+    parser.add_argument("--no-classify", dest="classify", action="store_false", help="OCR only.")
+    parser.add_argument("--classify-batch-size", type=int, default=int(os.getenv("ENSEMBLE_BATCH_SIZE", "8")))
+    parser.add_argument("--include-pages", action="store_true", help="Write every page result, not just the document text.")
+    parser.add_argument("--retry-failed", action="store_true", help="Redo documents that failed in an earlier run.")
+    args = parser.parse_args()
+
+    paths = find_documents(args.source)
+    done = completed_documents(args.output, args.retry_failed)
+    todo = [path for path in paths if path not in done]
+    log_event(logger, logging.INFO, "Bulk run starting", documents=len(paths), already_done=len(paths) - len(todo),
+              workers=args.workers, mode=args.mode, classify=args.classify, output=args.output)
+    if not todo:
+        return
+
+    try:
+        summary = run(todo, args)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    log_event(logger, logging.INFO, "Bulk run finished", **summary)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge
+
+from telemetry import configure_logging, log_event
+
+logger = configure_logging("circuit_breaker")
+
+# Consecutive failures that open a breaker.
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+# Seconds an open breaker skips its component before letting one probe through.
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "1") == "1"
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = Gauge("circuit_breaker_state", "Breaker state: 0 closed, 1 half-open, 2 open.", ["component"])
+BREAKER_TRANSITIONS = Counter("circuit_breaker_transitions_total", "Breaker state changes.", ["component", "state"])
+BREAKER_REJECTIONS = Counter("circuit_breaker_rejections_total", "Calls skipped because a breaker was open.", ["component"])
+
+
+# Closed: calls go through and consecutive failures are counted. Open: calls
+# are skipped until the cooldown has passed. Half-open: a single probe call
+# goes through; its outcome closes the breaker or opens it for another cooldown.
+class CircuitBreaker:
+    def __init__(self, component: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.component = component
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self._probing = False
+        self._lock = threading.Lock()
+        BREAKER_STATE.labels(component).set(_STATE_VALUES[CLOSED])
+
+    def _transition(self, state: str):
+        # Called with the lock held.
+        if state == self.state:
+            return
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        BREAKER_STATE.labels(self.component).set(_STATE_VALUES[state])
+        BREAKER_TRANSITIONS.labels(self.component, state).inc()
+        log_event(logger, logging.WARNING if state == OPEN else logging.INFO, "Circuit breaker state changed",
+                  component=self.component, state=state, failures=self.failures, error=self.last_error)
+
+    def available(self) -> bool:
+        # Whether a call could go through now, without claiming the half-open probe.
+        with self._lock:
+            if not BREAKER_ENABLED or self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return not self._probing
+
+    def allow(self) -> bool:
+        # Must be followed by record_success or record_failure when it returns True.
+        with self._lock:
+            if not BREAKER_ENABLED or self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+        BREAKER_REJECTIONS.labels(self.component).inc()
+        return False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return BREAKER_ENABLED and self.state == OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._transition(CLOSED)
+
+    def record_failure(self, error: Exception = None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error is not None else None
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._probing = False
+                self._transition(OPEN)
+                # A failed probe restarts the cooldown.
+                self.opened_at = time.monotonic()
+
+    def summary(self) -> Dict:
+        with self._lock:
+            summary = {"state": self.state, "failures": self.failures}
+            if self.state != CLOSED:
+                summary["last_error"] = self.last_error
+                summary["retry_in"] = round(max(0.0, self.cooldown - (time.monotonic() - self.opened_at)), 1)
+            return summary
+
+
+# One breaker per OCR engine and per correction stage, shared by every page in the process.
+class CircuitBreakers:
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, component: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(component)
+            if breaker is None:
+                breaker = self._breakers[component] = CircuitBreaker(component)
+            return breaker
+
+    def states(self) -> Dict[str, str]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.component: breaker.state for breaker in breakers}
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.component: breaker.summary() for breaker in breakers}
@@ -1,38 +1,215 @@
+import os
+os.environ.setdefault("RESOURCE_ROLE", "classifier")
+from resource_config import RESOURCES  # before torch: exports the classifier's OpenMP/MKL thread limits
 from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from transformers import BertTokenizer, BertForSequenceClassification, BertConfig
-from safetensors import safe_open
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from contextlib import asynccontextmanager
 import torch
 import numpy as np
 import json
-import os
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
 from typing import (
     Dict,
+    List,
+    Optional,
     Union
 )
 import io
+import logging
+from prometheus_client import Counter
+from ensemble_engine import EnsembleEngine, EnsembleMember
+from telemetry import configure_logging, instrument_app, log_event, span
 
-app = FastAPI()
+logger = configure_logging("classification_service")
 
 MODEL_DIR = "/app/models"
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+TORCH_NUM_THREADS = RESOURCES.classifier_threads
+TORCH_INTEROP_THREADS = RESOURCES.classifier_interop_threads
+WARMUP_BATCHES = int(os.getenv("WARMUP_BATCHES", "2"))
+WARMUP_SEQUENCE_LENGTHS = (64, 512)
+MAX_SEQUENCE_LENGTH = 512
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+# JSON mapping of member name to {"path": ..., "weight": ...}; each path uses the
+# save_model layout (config, weights, tokenizer files and label_encoder.json).
+ENSEMBLE_MEMBERS = json.loads(os.getenv("ENSEMBLE_MEMBERS", "{}") or "{}")
+PRIMARY_MODEL_WEIGHT = float(os.getenv("PRIMARY_MODEL_WEIGHT", "1.0"))
+ENSEMBLE_EARLY_EXIT = float(os.getenv("ENSEMBLE_EARLY_EXIT", "0") or "0") or None
+ENSEMBLE_BATCH_SIZE = int(os.getenv("ENSEMBLE_BATCH_SIZE", "8"))
+
+CACHE_LOOKUPS = Counter("classification_cache_lookups_total", "Prediction cache lookups by result.", ["result"])
+CLASSIFICATIONS = Counter("classifications_total", "Classification requests by outcome.", ["outcome"])
+EARLY_EXITS = Counter("classification_early_exits_total", "Predictions answered by the first ensemble member alone.")
+
 model = None
 tokenizer = None
 id2label = None
 label2id = None
+model_version = None
+ensemble_engine = None
+# Whether cache keys may lowercase and collapse whitespace; only when every
+# member's tokenizer does the same (see normalization_safe).
+cache_key_normalized = False
+# Predictions run on worker threads; one at a time, as on the event loop
+# before, since each already uses every torch thread and fast tokenizers
+# refuse concurrent calls.
+predict_lock = threading.Lock()
+
+service_state = {
+    "started_at": time.time(),
+    "ready": False,
+    "error": None,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "weights_loader": None,
+}
+
+def configure_torch_threads():
+    if TORCH_NUM_THREADS > 0:
+        torch.set_num_threads(TORCH_NUM_THREADS)
+    if TORCH_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError as e:
+            log_event(logger, logging.WARNING, "Could not set interop threads", error=str(e))
+    log_event(logger, logging.INFO, "Torch threads configured", intra_op=torch.get_num_threads(), inter_op=torch.get_num_interop_threads(),
+              cpus=RESOURCES.cpus, cpu_source=RESOURCES.cpu_source)
+
+class PredictionCache:
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+
+def predict(texts: List[str]) -> List[Dict]:
+    with predict_lock:
+        return ensemble_engine.predict(texts)
+
+def normalization_safe(member_tokenizer) -> bool:
+    # Uncased WordPiece tokenizers lowercase and split on any whitespace run,
+    # so case and spacing never reach the model. Cased or whitespace-aware
+    # (BPE, SentencePiece) ones tokenize the probe differently.
+    if getattr(member_tokenizer, "do_lower_case", None) is False:
+        return False
+    probe = "The  Quick\tBrown\n\nFOX"
+    return member_tokenizer.tokenize(probe) == member_tokenizer.tokenize(" ".join(probe.lower().split()))
+
+def prediction_cache_key(text: str) -> str:
+    # Every whitespace-separated word yields at least one token, so texts that
+    # share their first MAX_SEQUENCE_LENGTH words are identical after
+    # truncation. The key is otherwise the raw text, normalized only when no
+    # member's tokenizer could tell the difference.
+    if cache_key_normalized:
+        key_text = " ".join(text.lower().split()[:MAX_SEQUENCE_LENGTH])
+    else:
+        words = list(re.finditer(r"\S+", text))
+        key_text = text[:words[MAX_SEQUENCE_LENGTH - 1].end()] if len(words) > MAX_SEQUENCE_LENGTH else text
+    digest = hashlib.sha256(model_version.encode("utf-8"))
+    digest.update(key_text.encode("utf-8"))
+    return digest.hexdigest()
+
+def compute_model_version(class_labels) -> str:
+    digest = hashlib.sha256(json.dumps(class_labels).encode("utf-8"))
+    model_dirs = [("primary", MODEL_DIR, PRIMARY_MODEL_WEIGHT)]
+    model_dirs += [(name, spec["path"], spec.get("weight", 1.0)) for name, spec in sorted(ENSEMBLE_MEMBERS.items())]
+    digest.update(json.dumps(ENSEMBLE_EARLY_EXIT).encode("utf-8"))
+    for name, model_dir, weight in model_dirs:
+        digest.update(f"{name}:{weight}".encode("utf-8"))
+        for filename in ("config.json", "model.safetensors", "pytorch_model.bin", "vocab.txt"):
+            path = os.path.join(model_dir, filename)
+            if os.path.exists(path):
+                stat = os.stat(path)
+                digest.update(f"{name}/{filename}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def load_ensemble_members(class_labels) -> List[EnsembleMember]:
+    members = []
+    for name, spec in ENSEMBLE_MEMBERS.items():
+        member_dir = spec["path"]
+        with open(os.path.join(member_dir, "label_encoder.json"), 'r', encoding='utf-8') as f:
+            member_labels = json.load(f)
+        if member_labels != class_labels:
+            raise ValueError(f"Ensemble member '{name}' labels {member_labels} do not match {class_labels}.")
+
+        member_tokenizer = AutoTokenizer.from_pretrained(member_dir)
+        member_model = AutoModelForSequenceClassification.from_pretrained(
+            member_dir,
+            low_cpu_mem_usage=True
+        )
+        member_model.to(DEVICE)
+        member_model.eval()
+        members.append(EnsembleMember(name=name, model=member_model, tokenizer=member_tokenizer, weight=float(spec.get("weight", 1.0))))
+        log_event(logger, logging.INFO, "Ensemble member loaded", member=name, path=member_dir)
+    return members
 
 def load_model_components():
-    global model, tokenizer, id2label, label2id
+    global model, tokenizer, id2label, label2id, model_version, ensemble_engine, cache_key_normalized
 
     try:
         if not os.path.exists(MODEL_DIR):
             raise FileNotFoundError(f"Model directory '{MODEL_DIR}' not found. Please ensure your model files are placed in this directory.")
 
-        print(f"Loading components from {MODEL_DIR}...")
+        log_event(logger, logging.INFO, "Loading components", model_dir=MODEL_DIR)
 
         tokenizer = BertTokenizer.from_pretrained(MODEL_DIR)
-        print("✅ BertTokenizer loaded.")
+        logger.info("BertTokenizer loaded.")
 
         label_encoder_path = os.path.join(MODEL_DIR, "label_encoder.json")
         if not os.path.exists(label_encoder_path):
@@ -43,37 +220,142 @@ def load_model_components():
         
         id2label = {i: label for i, label in enumerate(class_labels)}
         label2id = {label: i for i, label in enumerate(class_labels)}
-        print(f"✅ Label mappings loaded: {id2label}")
+        log_event(logger, logging.INFO, "Label mappings loaded", labels=class_labels)
 
         config = BertConfig.from_pretrained(MODEL_DIR)
         config.num_labels = len(class_labels)
         config.id2label = id2label
         config.label2id = label2id
-        print("✅ Model configuration loaded.")
+        logger.info("Model configuration loaded.")
 
-        model = BertForSequenceClassification.from_pretrained(
+        # With model.safetensors present, from_pretrained memory-maps the file
+        # and (low_cpu_mem_usage) builds the model on the meta device, so the
+        # weights are neither allocated twice nor randomly initialised first.
+        loaded_model = BertForSequenceClassification.from_pretrained(
             MODEL_DIR,
-            config=config
+            config=config,
+            low_cpu_mem_usage=True
+        )
+        safetensors = os.path.exists(os.path.join(MODEL_DIR, "model.safetensors"))
+        service_state["weights_loader"] = "from_pretrained-safetensors" if safetensors else "from_pretrained"
+
+        loaded_model.to(DEVICE)
+        loaded_model.eval()
+        model = loaded_model
+
+        members = [EnsembleMember(name="fine_tuned_bert", model=model, tokenizer=tokenizer, weight=PRIMARY_MODEL_WEIGHT)]
+        members += load_ensemble_members(class_labels)
+        if ensemble_engine is not None:
+            ensemble_engine.close()
+        ensemble_engine = EnsembleEngine(
+            members,
+            class_labels,
+            device=DEVICE,
+            max_length=MAX_SEQUENCE_LENGTH,
+            batch_size=ENSEMBLE_BATCH_SIZE,
+            early_exit_threshold=ENSEMBLE_EARLY_EXIT
         )
-        model.to(DEVICE)
-        model.eval()
-        print("✅ Fine-tuned BERT model loaded.")
+        log_event(logger, logging.INFO, "Serving ensemble", members=ensemble_engine.member_names, early_exit=ENSEMBLE_EARLY_EXIT)
+
+        cache_key_normalized = all(normalization_safe(member.tokenizer) for member in members)
+        model_version = compute_model_version(class_labels)
+        prediction_cache.clear()
+        log_event(logger, logging.INFO, "Fine-tuned BERT model loaded", weights_loader=service_state["weights_loader"],
+                  model_version=model_version, cache_key_normalized=cache_key_normalized)
 
     except Exception as e:
         raise RuntimeError(f"Model loading failed: {str(e)}")
 
-@app.on_event("startup")
-async def startup_event():
-    global model, tokenizer, id2label, label2id
+def warmup_model():
+    if WARMUP_BATCHES <= 0:
+        return
+    for seq_len in WARMUP_SEQUENCE_LENGTHS:
+        ensemble_engine.predict_proba(["warmup " * seq_len] * WARMUP_BATCHES)
+
+def initialize_service():
     try:
+        start = time.perf_counter()
+        configure_torch_threads()
         load_model_components()
-        print("✅ All model components loaded successfully!")
+        service_state["load_seconds"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        warmup_model()
+        service_state["warmup_seconds"] = round(time.perf_counter() - start, 3)
+
+        service_state["ready"] = True
+        log_event(
+            logger, logging.INFO, "All model components loaded",
+            load_seconds=service_state["load_seconds"], warmup_seconds=service_state["warmup_seconds"],
+        )
     except Exception as e:
-        print(f"❌ Fatal error during model loading at startup: {str(e)}")
-        raise RuntimeError(f"Service startup failed due to model loading error: {str(e)}")
+        service_state["error"] = str(e)
+        logger.exception("Fatal error during model loading at startup")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Loading runs in the background so the port binds immediately; /readyz
+    # reports when the model can serve requests.
+    threading.Thread(target=initialize_service, name="model-loader", daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+instrument_app(app)
+
+@app.get("/healthz")
+async def healthz():
+    return {
+        "status": "ok",
+        "uptime_seconds": round(time.time() - service_state["started_at"], 3),
+    }
+
+@app.get("/readyz")
+async def readyz():
+    body = {
+        "ready": service_state["ready"],
+        "error": service_state["error"],
+        "load_seconds": service_state["load_seconds"],
+        "warmup_seconds": service_state["warmup_seconds"],
+        "weights_loader": service_state["weights_loader"],
+        "model_version": model_version,
+        "ensemble_members": ensemble_engine.member_names if ensemble_engine is not None else [],
+        "torch_threads": torch.get_num_threads(),
+        "torch_interop_threads": torch.get_num_interop_threads(),
+        "cpus": RESOURCES.cpus,
+        "cpu_source": RESOURCES.cpu_source,
+    }
+    return JSONResponse(body, status_code=200 if service_state["ready"] else 503)
+
+@app.get("/cache_stats")
+async def cache_stats():
+    return {"model_version": model_version, **prediction_cache.stats()}
+
+@app.get("/ensemble_stats")
+async def ensemble_stats():
+    if ensemble_engine is None:
+        raise HTTPException(503, "Classification service not ready.")
+    return ensemble_engine.latency_stats()
 
 class PredictionResponse(BaseModel):
     predicted_class: str
+    confidence: Optional[float] = None
+    class_probabilities: Optional[Dict[str, float]] = None
+
+class BatchClassificationRequest(BaseModel):
+    texts: List[str]
+
+class BatchPredictionResponse(BaseModel):
+    results: List[PredictionResponse]
+
+def prediction_result(prediction: Dict) -> Dict:
+    if prediction["early_exit"]:
+        EARLY_EXITS.inc()
+    CLASSIFICATIONS.labels("computed").inc()
+    return {
+        "predicted_class": prediction["predicted_class"],
+        "confidence": prediction["confidence"],
+        "class_probabilities": prediction["class_probabilities"],
+    }
 
 @app.post("/classify", response_model=PredictionResponse)
 async def classify_input(
@@ -97,31 +379,72 @@ async def classify_input(
         if not input_text:
             raise HTTPException(400, "Input text cannot be empty or consist only of whitespace.")
         
-        if model is None or tokenizer is None or id2label is None:
-            raise HTTPException(500, "Classification service not initialized. Models are not loaded.")
+        if not service_state["ready"] or ensemble_engine is None or id2label is None:
+            raise HTTPException(503, "Classification service not ready. Models are still loading or failed to load.")
 
-        inputs = tokenizer(
-            input_text,
-            padding=True,
-            truncation=True,
-            max_length=512,
-            return_tensors="pt"
-        ).to(DEVICE)
+        cache_key = prediction_cache_key(input_text)
+        cached = prediction_cache.get(cache_key)
+        CACHE_LOOKUPS.labels("hit" if cached is not None else "miss").inc()
+        if cached is not None:
+            CLASSIFICATIONS.labels("cache_hit").inc()
+            return cached
+
+        with span("classify", logger=logger, chars=len(input_text)):
+            prediction = (await run_in_threadpool(predict, [input_text]))[0]
+        result = prediction_result(prediction)
+        prediction_cache.put(cache_key, result)
+        return result
+
+    except HTTPException as e:
+        CLASSIFICATIONS.labels(f"http_{e.status_code}").inc()
+        raise e
+    except Exception as e:
+        CLASSIFICATIONS.labels("error").inc()
+        logger.exception("Classification failed")
+        raise HTTPException(status_code=500, detail=f"Classification error: {str(e)}")
+
+@app.post("/classify_batch", response_model=BatchPredictionResponse)
+async def classify_batch(request: BatchClassificationRequest):
+    # One forward pass (in ENSEMBLE_BATCH_SIZE chunks) for every text the
+    # cache does not already answer; results keep the request's order.
+    try:
+        texts = [text.strip() for text in request.texts]
+        if not texts:
+            raise HTTPException(400, "'texts' must contain at least one text.")
+        if not all(texts):
+            raise HTTPException(400, "Input texts cannot be empty or consist only of whitespace.")
 
-        with torch.no_grad():
-            outputs = model(**inputs)
+        if not service_state["ready"] or ensemble_engine is None or id2label is None:
+            raise HTTPException(503, "Classification service not ready. Models are still loading or failed to load.")
 
-        logits = outputs.logits
-        probabilities = torch.softmax(logits, dim=1).cpu().numpy()[0]
-        predicted_class_id = np.argmax(probabilities)
+        results: List[Optional[Dict]] = [None] * len(texts)
+        cache_keys = [prediction_cache_key(text) for text in texts]
+        misses = []
+        for i, cache_key in enumerate(cache_keys):
+            cached = prediction_cache.get(cache_key)
+            CACHE_LOOKUPS.labels("hit" if cached is not None else "miss").inc()
+            if cached is not None:
+                CLASSIFICATIONS.labels("cache_hit").inc()
+                results[i] = cached
+            else:
+                misses.append(i)
 
-        return {
-            "predicted_class": id2label[predicted_class_id]
-        }
+        if misses:
+            # The forward passes run on a worker thread so the loop keeps
+            # answering health probes and cache hits meanwhile.
+            with span("classify", logger=logger, batch=len(misses)):
+                predictions = await run_in_threadpool(predict, [texts[i] for i in misses])
+            for i, prediction in zip(misses, predictions):
+                results[i] = prediction_result(prediction)
+                prediction_cache.put(cache_keys[i], results[i])
+        return {"results": results}
 
     except HTTPException as e:
+        CLASSIFICATIONS.labels(f"http_{e.status_code}").inc()
         raise e
     except Exception as e:
+        CLASSIFICATIONS.labels("error").inc()
+        logger.exception("Batch classification failed")
         raise HTTPException(status_code=500, detail=f"Classification error: {str(e)}")
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from prometheus_client import Gauge
+
+from telemetry import configure_logging, log_event
+
+logger = configure_logging("engine_registry")
+
+COMPONENT_READY = Gauge("engine_component_ready", "1 once a registered component has initialized.", ["component"])
+COMPONENT_INIT_SECONDS = Gauge("engine_component_init_seconds", "Seconds a component took to initialize.", ["component"])
+
+
+@dataclass
+class Component:
+    name: str
+    factory: Callable[[], Any]
+    depends_on: Tuple[str, ...] = ()
+    on_ready: Optional[Callable[[Any], None]] = None
+    state: str = "pending"
+    value: Any = None
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    seconds: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+# Initializes components on background threads, each as soon as its
+# dependencies are ready, so the server can bind and serve with whatever is
+# already loaded. A component that fails leaves its dependents failed too.
+class EngineRegistry:
+    def __init__(self):
+        self._components: Dict[str, Component] = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def register(self, name: str, factory: Callable[[], Any], depends_on: Sequence[str] = (), on_ready: Callable[[Any], None] = None):
+        with self._lock:
+            if self._started:
+                raise RuntimeError(f"Cannot register '{name}' after the registry has started.")
+            self._components[name] = Component(name=name, factory=factory, depends_on=tuple(depends_on), on_ready=on_ready)
+            COMPONENT_READY.labels(name).set(0)
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for component in self._components.values():
+            threading.Thread(target=self._initialize, args=(component,), name=f"init-{component.name}", daemon=True).start()
+
+    def _initialize(self, component: Component):
+        for dependency in component.depends_on:
+            upstream = self._components[dependency]
+            upstream.done.wait()
+            if upstream.state != "ready":
+                self._finish(component, "failed", error=f"dependency '{dependency}' {upstream.state}")
+                return
+
+        component.state = "loading"
+        component.started_at = time.perf_counter()
+        try:
+            value = component.factory()
+            if component.on_ready is not None:
+                component.on_ready(value)
+        except Exception as e:
+            logger.exception(f"Component '{component.name}' failed to initialize")
+            self._finish(component, "failed", error=str(e))
+            return
+        self._finish(component, "ready", value=value)
+
+    def _finish(self, component: Component, state: str, value: Any = None, error: str = None):
+        if component.started_at is not None:
+            component.seconds = round(time.perf_counter() - component.started_at, 3)
+            COMPONENT_INIT_SECONDS.labels(component.name).set(component.seconds)
+        component.value = value
+        component.error = error
+        component.state = state
+        COMPONENT_READY.labels(component.name).set(1 if state == "ready" else 0)
+        log_event(logger, logging.INFO if state == "ready" else logging.ERROR, "Component initialized" if state == "ready" else "Component unavailable",
+                  component=component.name, state=state, seconds=component.seconds, error=error)
+        component.done.set()
+
+    def get(self, name: str) -> Any:
+        # Never blocks: None until the component is ready.
+        component = self._components.get(name)
+        if component is None or component.state != "ready":
+            return None
+        return component.value
+
+    def is_ready(self, name: str) -> bool:
+        component = self._components.get(name)
+        return component is not None and component.state == "ready"
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> Any:
+        component = self._components[name]
+        component.done.wait(timeout)
+        return self.get(name)
+
+    def wait_any(self, names: Iterable[str], timeout: Optional[float] = None) -> bool:
+        names = list(names)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if any(self.is_ready(name) for name in names):
+                return True
+            if all(self._components[name].done.is_set() for name in names):
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+
+    def wait_all(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for component in self._components.values():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not component.done.wait(remaining):
+                return False
+        return all(c.state == "ready" for c in self._components.values())
+
+    def unsettled(self) -> Dict[str, str]:
+        # Components whose initialization thread has not finished, ready or failed.
+        return {name: c.state for name, c in self._components.items() if not c.done.is_set()}
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {"state": c.state, "seconds": c.seconds, "error": c.error, "depends_on": list(c.depends_on)}
+            for name, c in self._components.items()
+        }
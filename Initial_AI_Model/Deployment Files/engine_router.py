@@ -0,0 +1,149 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+# Weight of the newest observation in the rolling averages.
+ROUTER_ALPHA = float(os.getenv("ROUTER_ALPHA", "0.2"))
+# Pages an engine must have been tried on before its statistics count.
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "3"))
+# Every Nth page of a document leads with an engine the router has been skipping.
+ROUTER_REPROBE_INTERVAL = int(os.getenv("ROUTER_REPROBE_INTERVAL", "10"))
+# Extra seconds charged per region, e.g. for engines billed per request.
+ROUTER_ENGINE_PENALTY = json.loads(os.getenv("ROUTER_ENGINE_PENALTY", '{"Google Vision": 2.0}') or "{}")
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") == "1"
+
+ROUTING_DECISIONS = Counter("ocr_routing_decisions_total", "Engine orderings chosen per page.", ["reason", "first_engine"])
+
+_WORD_RE = re.compile(r"^[\"'(\[]*[A-Za-z][A-Za-z'\-]*[.,;:!?)\]\"']*$")
+
+
+def text_confidence(text: str) -> float:
+    # Engine-agnostic plausibility of OCR output: the share of tokens that look
+    # like words rather than symbol soup. Cheap enough to run on every attempt.
+    tokens = text.split()
+    if not tokens:
+        return 0.0
+    return sum(1 for token in tokens if _WORD_RE.match(token)) / len(tokens)
+
+
+@dataclass
+class RollingStats:
+    samples: int = 0
+    success: float = 0.0
+    latency: float = 0.0
+    confidence: float = 0.0
+
+    def update(self, success: float, latency: float, confidence: float, alpha: float = ROUTER_ALPHA):
+        if self.samples == 0:
+            self.success, self.latency, self.confidence = success, latency, confidence
+        else:
+            self.success += alpha * (success - self.success)
+            self.latency += alpha * (latency - self.latency)
+            self.confidence += alpha * (confidence - self.confidence)
+        self.samples += 1
+
+    def expected_cost(self, penalty: float = 0.0) -> float:
+        # Seconds per useful result: ordering engines by cost over probability
+        # of success minimizes the expected time spent down the fallback chain.
+        return (self.latency + penalty) / max(self.success * self.confidence, 0.01)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "samples": self.samples,
+            "success": round(self.success, 3),
+            "latency": round(self.latency, 4),
+            "confidence": round(self.confidence, 3),
+        }
+
+
+# Statistics shared by every document in the process, keyed by (engine, page type).
+class EngineRouter:
+    def __init__(self, engines: List[str]):
+        self.engines = list(engines)
+        self._stats: Dict[Tuple[str, str], RollingStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, engine: str, page_type: str, success: float, latency: float, confidence: float):
+        with self._lock:
+            self._stats.setdefault((engine, page_type), RollingStats()).update(success, latency, confidence)
+
+    def stats(self, engine: str, page_type: str) -> Optional[RollingStats]:
+        with self._lock:
+            stats = self._stats.get((engine, page_type))
+            return RollingStats(**vars(stats)) if stats is not None else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        with self._lock:
+            snapshot: Dict[str, Dict[str, Dict[str, float]]] = {}
+            for (engine, page_type), stats in self._stats.items():
+                snapshot.setdefault(page_type, {})[engine] = stats.as_dict()
+            return snapshot
+
+    def document(self) -> "DocumentRouter":
+        return DocumentRouter(self)
+
+
+# Per-document view: prefers what this document has shown so far and falls
+# back to the process-wide statistics until it has enough pages of its own.
+class DocumentRouter:
+    def __init__(self, router: EngineRouter):
+        self.router = router
+        self.pages = 0
+        self._stats: Dict[Tuple[str, str], RollingStats] = {}
+        self._last_led: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _stats_for(self, engine: str, page_type: str) -> Tuple[Optional[RollingStats], str]:
+        local = self._stats.get((engine, page_type))
+        if local is not None and local.samples >= ROUTER_MIN_SAMPLES:
+            return local, "document"
+        shared = self.router.stats(engine, page_type)
+        if shared is not None and shared.samples >= ROUTER_MIN_SAMPLES:
+            return shared, "global"
+        return None, "none"
+
+    def order(self, page_type: str, available: List[str]) -> Tuple[List[str], Dict]:
+        # `available` is in the default fallback order.
+        with self._lock:
+            self.pages += 1
+            page_index = self.pages
+            costs = {}
+            sources = {}
+            for engine in available:
+                stats, sources[engine] = self._stats_for(engine, page_type)
+                if stats is not None:
+                    costs[engine] = round(stats.expected_cost(ROUTER_ENGINE_PENALTY.get(engine, 0.0)), 4)
+
+            if not ROUTER_ENABLED or not costs:
+                order, reason = list(available), "default"
+            else:
+                known = sorted(costs, key=costs.get)
+                order = known + [engine for engine in available if engine not in costs]
+                reason = "stats"
+                if ROUTER_REPROBE_INTERVAL > 0 and page_index % ROUTER_REPROBE_INTERVAL == 0 and len(order) > 1:
+                    # Lead with the engine that has gone longest without leading.
+                    probe = min(order[1:], key=lambda engine: self._last_led.get(engine, 0))
+                    order.remove(probe)
+                    order.insert(0, probe)
+                    reason = "reprobe"
+            if order:
+                self._last_led[order[0]] = page_index
+
+        ROUTING_DECISIONS.labels(reason, order[0] if order else "None").inc()
+        return order, {
+            "page_type": page_type,
+            "order": order,
+            "reason": reason,
+            "expected_cost": costs,
+            "stats_source": sources,
+        }
+
+    def record(self, engine: str, page_type: str, success: float, latency: float, confidence: float):
+        with self._lock:
+            self._stats.setdefault((engine, page_type), RollingStats()).update(success, latency, confidence)
+        self.router.record(engine, page_type, success, latency, confidence)
@@ -0,0 +1,211 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+import requests
+from prometheus_client import Counter
+
+from circuit_breaker import CircuitBreaker
+from ocr_service import FITZ_LOCK, PdfSource, ocr_ready, open_pdf, process_pdf_with_fallback
+from telemetry import configure_logging, log_event, span
+
+logger = configure_logging("page_dispatch")
+
+# Base URLs of OCR worker services, comma-separated. Workers run this same
+# service with OCR_WORKER_URLS unset; an empty list keeps OCR in-process.
+OCR_WORKER_URLS = [url.strip().rstrip("/") for url in os.getenv("OCR_WORKER_URLS", "").split(",") if url.strip()]
+DISPATCH_BATCH_PAGES = int(os.getenv("DISPATCH_BATCH_PAGES", "4"))
+# Batches a worker holds at once; its page scheduler interleaves their pages.
+DISPATCH_WORKER_CONCURRENCY = int(os.getenv("DISPATCH_WORKER_CONCURRENCY", "2"))
+# Workers tried per batch before its pages fall back to this process.
+DISPATCH_MAX_ATTEMPTS = int(os.getenv("DISPATCH_MAX_ATTEMPTS", "3"))
+DISPATCH_TIMEOUT_SECONDS = float(os.getenv("DISPATCH_TIMEOUT_SECONDS", "600"))
+DISPATCH_LOCAL_FALLBACK = os.getenv("DISPATCH_LOCAL_FALLBACK", "1") == "1"
+# Weight of the newest batch in a worker's seconds-per-page average.
+DISPATCH_ALPHA = float(os.getenv("DISPATCH_ALPHA", "0.3"))
+
+DISPATCHED_BATCHES = Counter("ocr_dispatch_batches_total", "Page batches sent to OCR workers, by outcome.", ["worker", "outcome"])
+LOCAL_FALLBACK_PAGES = Counter("ocr_dispatch_local_fallback_pages_total", "Pages OCRed in-process after every worker attempt failed.")
+
+
+class OCRWorker:
+    def __init__(self, url: str):
+        self.url = url
+        self.breaker = CircuitBreaker(f"ocr_worker:{url}")
+        self.in_flight = 0
+        self.queued_pages = 0
+        self.pages_done = 0
+        self.seconds_per_page: Optional[float] = None
+
+    def expected_seconds(self, pages: int, default_seconds_per_page: float) -> float:
+        # When a batch sent now would finish: everything queued here plus it.
+        return (self.queued_pages + pages) * (self.seconds_per_page or default_seconds_per_page)
+
+    def summary(self) -> Dict:
+        return {
+            "breaker": self.breaker.summary(),
+            "in_flight": self.in_flight,
+            "queued_pages": self.queued_pages,
+            "pages_done": self.pages_done,
+            "seconds_per_page": round(self.seconds_per_page, 3) if self.seconds_per_page is not None else None,
+        }
+
+
+def extract_pages(doc: fitz.Document, page_numbers: List[int]) -> bytes:
+    # A small PDF with just these pages; the worker never sees the rest.
+    with FITZ_LOCK:
+        batch = fitz.open()
+        try:
+            for page_number in page_numbers:
+                batch.insert_pdf(doc, from_page=page_number - 1, to_page=page_number - 1)
+            return batch.tobytes(garbage=1)
+        finally:
+            batch.close()
+
+
+# Scatters a document's pages over the OCR workers in batches and gathers the
+# results in page order. Each batch goes to the worker expected to finish it
+# first, from the pages already queued there and its measured seconds per page.
+# Pages a worker fails are sent to another one; a worker whose requests keep
+# failing is skipped by its circuit breaker until a probe succeeds.
+class PageDispatcher:
+    def __init__(self, urls: List[str], batch_pages: int = DISPATCH_BATCH_PAGES,
+                 concurrency: int = DISPATCH_WORKER_CONCURRENCY, max_attempts: int = DISPATCH_MAX_ATTEMPTS):
+        self.workers = [OCRWorker(url) for url in urls]
+        self.batch_pages = max(1, batch_pages)
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self._cond = threading.Condition()
+        self._session = requests.Session()
+
+    def available(self) -> bool:
+        return any(worker.breaker.available() for worker in self.workers)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._cond:
+            return {worker.url: worker.summary() for worker in self.workers}
+
+    def _default_seconds_per_page(self) -> float:
+        # Unmeasured workers are assumed to be as fast as the measured ones.
+        measured = [worker.seconds_per_page for worker in self.workers if worker.seconds_per_page is not None]
+        return sum(measured) / len(measured) if measured else 1.0
+
+    def _acquire(self, pages: int, avoid: set) -> Optional[OCRWorker]:
+        # Waits while every usable worker is at its concurrency limit; None
+        # once every worker's breaker is open.
+        with self._cond:
+            while True:
+                usable = [worker for worker in self.workers if worker.breaker.available()]
+                if not usable:
+                    return None
+                # Workers that already failed this batch only get it back
+                # when no other worker is usable, not merely when others are busy.
+                usable = [worker for worker in usable if worker.url not in avoid] or usable
+                candidates = [worker for worker in usable if worker.in_flight < self.concurrency]
+                if candidates:
+                    default = self._default_seconds_per_page()
+                    worker = min(candidates, key=lambda worker: worker.expected_seconds(pages, default))
+                    # A half-open breaker lets one probe through; another batch may have taken it.
+                    if worker.breaker.allow():
+                        worker.in_flight += 1
+                        worker.queued_pages += pages
+                        return worker
+                    continue
+                self._cond.wait(timeout=1.0)
+
+    def _release(self, worker: OCRWorker, pages: int, seconds: Optional[float] = None, done: int = 0):
+        with self._cond:
+            worker.in_flight -= 1
+            worker.queued_pages -= pages
+            if seconds is not None and done:
+                per_page = seconds / done
+                if worker.seconds_per_page is None:
+                    worker.seconds_per_page = per_page
+                else:
+                    worker.seconds_per_page += DISPATCH_ALPHA * (per_page - worker.seconds_per_page)
+                worker.pages_done += done
+            self._cond.notify_all()
+
+    def _send(self, worker: OCRWorker, data: bytes, page_numbers: List[int]) -> Tuple[List[dict], Dict[int, str]]:
+        response = self._session.post(
+            f"{worker.url}/ocr_pages",
+            params={"pages": ",".join(str(page_number) for page_number in page_numbers)},
+            files={"file": ("pages.pdf", data, "application/pdf")},
+            timeout=DISPATCH_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+        body = response.json()
+        page_errors = {int(page_number): error for page_number, error in (body.get("page_errors") or {}).items()}
+        results = body.get("pages") or []
+        if sorted(result["page_number"] for result in results) != sorted(set(page_numbers) - set(page_errors)):
+            raise ValueError("worker returned results for other pages than were sent")
+        return results, page_errors
+
+    def _run_batch(self, doc: fitz.Document, page_numbers: List[int]) -> Tuple[List[dict], Dict[int, str]]:
+        results = []
+        errors: Dict[int, str] = {}
+        remaining = list(page_numbers)
+        avoid = set()
+        for _ in range(self.max_attempts):
+            worker = self._acquire(len(remaining), avoid)
+            if worker is None:
+                errors.update({page_number: "No OCR worker available" for page_number in remaining})
+                break
+            started = time.perf_counter()
+            try:
+                batch_results, page_errors = self._send(worker, extract_pages(doc, remaining), remaining)
+            except Exception as e:
+                self._release(worker, len(remaining))
+                worker.breaker.record_failure(e)
+                DISPATCHED_BATCHES.labels(worker.url, "failed").inc()
+                log_event(logger, logging.WARNING, "OCR worker batch failed", worker=worker.url, pages=remaining, error=str(e))
+                errors.update({page_number: f"{worker.url}: {e}" for page_number in remaining})
+                avoid.add(worker.url)
+                continue
+            self._release(worker, len(remaining), time.perf_counter() - started, len(batch_results))
+            # Page-level errors are the document's, not the worker's fault.
+            worker.breaker.record_success()
+            DISPATCHED_BATCHES.labels(worker.url, "partial" if page_errors else "ok").inc()
+            results.extend(batch_results)
+            for result in batch_results:
+                errors.pop(result["page_number"], None)
+            errors.update(page_errors)
+            remaining = sorted(page_errors)
+            if not remaining:
+                break
+            avoid.add(worker.url)
+        return results, {page_number: errors[page_number] for page_number in remaining}
+
+    def dispatch_pdf(self, pdf: PdfSource, page_numbers: List[int] = None) -> Tuple[List[dict], Dict[int, str]]:
+        # Returns the page results in page order and the pages that failed.
+        doc = open_pdf(pdf)
+        try:
+            page_numbers = page_numbers or list(range(1, doc.page_count + 1))
+            batches = [page_numbers[i:i + self.batch_pages] for i in range(0, len(page_numbers), self.batch_pages)]
+            results: List[dict] = []
+            errors: Dict[int, str] = {}
+            with span("dispatch", logger=logger, pages=len(page_numbers), batches=len(batches), workers=len(self.workers)):
+                with ThreadPoolExecutor(max(1, min(len(batches), len(self.workers) * self.concurrency))) as pool:
+                    for batch_results, batch_errors in pool.map(lambda batch: self._run_batch(doc, batch), batches):
+                        results.extend(batch_results)
+                        errors.update(batch_errors)
+        finally:
+            with FITZ_LOCK:
+                doc.close()
+
+        if errors and DISPATCH_LOCAL_FALLBACK and ocr_ready():
+            log_event(logger, logging.WARNING, "OCRing pages the workers failed locally", pages=sorted(errors))
+            LOCAL_FALLBACK_PAGES.inc(len(errors))
+            for result in process_pdf_with_fallback(pdf, sorted(errors)):
+                errors.pop(result["page_number"], None)
+                results.append(result)
+
+        results.sort(key=lambda result: result["page_number"])
+        return results, errors
+
+
+dispatcher = PageDispatcher(OCR_WORKER_URLS) if OCR_WORKER_URLS else None
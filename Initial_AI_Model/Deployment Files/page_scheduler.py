@@ -0,0 +1,150 @@
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from prometheus_client import Gauge
+
+from ocr_service import (
+    FITZ_LOCK, CLASSIFY_MAX_PAGES, CLASSIFY_TOKEN_BUDGET, PageSelection, PdfSource,
+    classification_candidates, engine_router, open_pdf, process_page, registry
+)
+from boilerplate import BoilerplateTracker
+from resource_config import RESOURCES
+from telemetry import configure_logging, log_event
+
+logger = configure_logging("page_scheduler")
+
+# Pages are CPU-bound in native code (torch, OpenCV, Tesseract), so one
+# thread per core this process owns keeps them busy (see resource_config).
+PAGE_WORKERS = RESOURCES.page_workers
+
+SCHEDULED_DOCUMENTS = Gauge("page_scheduler_documents", "Documents with pages still queued or in flight.")
+BUSY_WORKERS = Gauge("page_scheduler_busy_workers", "Page workers currently processing a page.")
+
+
+# One document's share of the scheduler. Pages are handed out one at a time,
+# so a long book never holds every worker while short ones wait. In classify
+# mode pages follow process_pdf_for_classification's selection (PageSelection)
+# and stop being handed out once the token budget is met; pages already in
+# flight still finish.
+class DocumentJob:
+    def __init__(self, name: str, pdf: PdfSource, mode: str = "full", token_budget: int = CLASSIFY_TOKEN_BUDGET,
+                 max_pages: Optional[int] = None):
+        self.name = name
+        self.mode = mode
+        self.max_pages = max_pages or (CLASSIFY_MAX_PAGES if mode == "classify" else None)
+        self.doc = open_pdf(pdf)
+        self.page_count = self.doc.page_count
+        if mode == "classify":
+            candidates = classification_candidates(self.page_count)
+        else:
+            candidates = list(range(1, self.page_count + 1))
+        self.pages = PageSelection(
+            self.doc, candidates, classify=mode == "classify", token_budget=token_budget, max_pages=self.max_pages
+        )
+        self.results: List[dict] = []
+        self.page_errors: Dict[int, str] = {}
+        self.done = threading.Event()
+        self.router = engine_router.document()
+        self.boilerplate = BoilerplateTracker()
+
+    @property
+    def in_flight(self) -> int:
+        return self.pages.in_flight
+
+    def next_page(self) -> Optional[int]:
+        # Called with the scheduler lock held.
+        return self.pages.next_page()
+
+    def record(self, page_number: int, result: Optional[dict], error: Optional[str]):
+        self.pages.record(page_number, result if error is None else None)
+        if error is not None:
+            self.page_errors[page_number] = error
+            return
+        self.results.append(result)
+
+    def finish(self):
+        with FITZ_LOCK:
+            self.doc.close()
+        self.results.sort(key=lambda r: r["page_number"])
+        log_event(logger, logging.INFO, "Document finished", document=self.name, pages=len(self.results),
+                  page_errors=len(self.page_errors), stopped=self.pages.stopped)
+        self.done.set()
+
+    def selection(self) -> Optional[dict]:
+        if self.mode != "classify":
+            return None
+        return self.pages.summary()
+
+
+# A fixed pool of page workers shared by every document in every request.
+# Each free worker takes the next page from the document after the one that
+# was served last, so documents progress round-robin regardless of length.
+class FairPageScheduler:
+    def __init__(self, workers: int = PAGE_WORKERS):
+        self.workers = workers
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._work, name=f"page-worker-{i}", daemon=True) for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, job: DocumentJob):
+        self.start()
+        with self._cond:
+            self._jobs.append(job)
+            SCHEDULED_DOCUMENTS.set(len(self._jobs))
+            self._cond.notify_all()
+
+    def run(self, jobs: List[DocumentJob]) -> List[DocumentJob]:
+        for job in jobs:
+            self.submit(job)
+        for job in jobs:
+            job.done.wait()
+        return jobs
+
+    def _take(self):
+        with self._cond:
+            while True:
+                for job in list(self._jobs):
+                    page_number = job.next_page()
+                    if page_number is not None:
+                        # Served: go to the back of the line.
+                        self._jobs.remove(job)
+                        self._jobs.append(job)
+                        return job, page_number
+                    if job.in_flight == 0:
+                        self._jobs.remove(job)
+                        SCHEDULED_DOCUMENTS.set(len(self._jobs))
+                        job.finish()
+                self._cond.wait()
+
+    def _work(self):
+        while True:
+            job, page_number = self._take()
+            result = error = None
+            BUSY_WORKERS.inc()
+            try:
+                with FITZ_LOCK:
+                    page = job.doc[page_number - 1]
+                result = process_page(page, page_number, registry.get("language_tool"), job.router, job.boilerplate)
+            except Exception as e:
+                error = str(e)
+                log_event(logger, logging.WARNING, "Page failed", document=job.name, page=page_number, error=error)
+            finally:
+                BUSY_WORKERS.dec()
+            with self._cond:
+                job.record(page_number, result, error)
+                self._cond.notify_all()
+
+
+scheduler = FairPageScheduler()
@@ -0,0 +1,140 @@
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+PREFORK_INIT_TIMEOUT = float(os.getenv("PREFORK_INIT_TIMEOUT", "900"))
+
+# The resource plan splits the cores across worker processes (and their page
+# threads) and exports native thread limits, so it must load before torch.
+os.environ.setdefault("OCR_PROCESS_MODEL", "prefork")
+from resource_config import RESOURCES
+OCR_WORKERS = RESOURCES.ocr_workers
+
+# prometheus_client picks its multi-process value store at import time, so the
+# directory has to exist before telemetry (and everything importing it) loads.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+import uvicorn
+from prometheus_client import multiprocess
+
+from telemetry import configure_logging, log_event
+import ocr_service
+from Orchestration import app
+
+logger = configure_logging("prefork_server")
+
+
+def load_shared_state():
+    # Everything loaded here (EasyOCR weights, SymSpell index, SpellChecker,
+    # compact vocabulary, the LanguageTool JVM) is inherited by every worker.
+    ocr_service.start_engines()
+    if ocr_service.registry.wait("precache") is None:
+        # A broken cache would only turn into slow downloads or missing
+        # vocabulary in every worker; exit so the orchestrator sees it.
+        log_event(logger, logging.CRITICAL, "Pre-cache verification failed", error=ocr_service.component_status()["precache"]["error"])
+        sys.exit(1)
+    fully_loaded = ocr_service.registry.wait_all(timeout=PREFORK_INIT_TIMEOUT)
+    unsettled = ocr_service.registry.unsettled()
+    if unsettled:
+        # Threads do not survive fork(): workers would inherit components
+        # stuck half-loaded, and locks their loaders hold, forever.
+        log_event(logger, logging.CRITICAL, "Components still loading after the init timeout",
+                  timeout=PREFORK_INIT_TIMEOUT, components=unsettled)
+        sys.exit(1)
+    log_event(
+        logger, logging.INFO if fully_loaded else logging.WARNING, "Parent finished loading",
+        fully_loaded=fully_loaded, components={name: status["state"] for name, status in ocr_service.component_status().items()},
+    )
+    # Move every surviving object into the permanent generation so the
+    # workers' collectors never write to the parent's pages.
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, worker_id: int):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    ocr_service.after_fork()
+
+    import torch
+    torch.set_num_threads(RESOURCES.torch_threads)
+
+    log_event(logger, logging.INFO, "Worker started", worker=worker_id, pid=os.getpid(), torch_threads=RESOURCES.torch_threads)
+    config = uvicorn.Config(app, log_config=None, timeout_keep_alive=5)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn_worker(sock: socket.socket, worker_id: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 0
+        try:
+            run_worker(sock, worker_id)
+        except Exception:
+            logger.exception("Worker crashed")
+            exit_code = 1
+        finally:
+            # Skip atexit and finalizers: language_tool_python would otherwise
+            # terminate the LanguageTool server the parent shares with all workers.
+            os._exit(exit_code)
+    return pid
+
+
+def main():
+    load_shared_state()
+    sock = bind_socket()
+    workers = {spawn_worker(sock, worker_id): worker_id for worker_id in range(OCR_WORKERS)}
+    log_event(logger, logging.INFO, "Serving", host=HOST, port=PORT, workers=OCR_WORKERS)
+
+    shutting_down = False
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker_id = workers.pop(pid, None)
+        if worker_id is None:
+            # Also a child of the parent: the LanguageTool JVM.
+            log_event(logger, logging.WARNING, "Non-worker child exited", pid=pid, status=status)
+            continue
+        multiprocess.mark_process_dead(pid)
+        if not shutting_down:
+            log_event(logger, logging.WARNING, "Worker exited, restarting", worker=worker_id, pid=pid, status=status)
+            workers[spawn_worker(sock, worker_id)] = worker_id
+
+    sock.close()
+    logger.info("All workers exited.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
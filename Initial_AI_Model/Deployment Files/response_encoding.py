@@ -0,0 +1,125 @@
+import gzip
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from prometheus_client import Counter, Histogram
+from starlette.concurrency import run_in_threadpool
+
+# orjson and zstandard are optional: without them responses fall back to the
+# standard json module and to gzip.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies smaller than this are sent uncompressed.
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_ZSTD_LEVEL = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+
+RESPONSE_BYTES = Histogram(
+    "ocr_response_bytes", "OCR response body size as sent, by detail level and encoding.", ["detail", "encoding"],
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+)
+RESPONSE_ENCODE_SECONDS = Histogram("ocr_response_encode_seconds", "Time spent serializing and compressing OCR responses.")
+RESPONSE_ENCODINGS = Counter("ocr_response_encodings_total", "OCR responses by content encoding.", ["encoding"])
+
+# How much of each page goes into a response:
+#   full          every field, as before
+#   no_raw        without each page's raw_text
+#   no_page_text  without each page's raw_text and corrected_text; the
+#                 document text is still in total_extracted_text
+#   summary       no pages and no text: page count, classification, selection
+DETAIL_LEVELS = ("full", "no_raw", "no_page_text", "summary")
+DETAIL_PATTERN = "^(" + "|".join(DETAIL_LEVELS) + ")$"
+_DROPPED_PAGE_FIELDS = {
+    "full": (),
+    "no_raw": ("raw_text",),
+    "no_page_text": ("raw_text", "corrected_text"),
+}
+
+
+def ocr_results(page_results: List[Dict], total_extracted_text: str, detail: str = "full") -> Dict[str, Any]:
+    # The OCRResponse body as plain dicts, without a model object per page.
+    body: Dict[str, Any] = {"page_count": len(page_results)}
+    if detail == "summary":
+        return body
+    dropped = _DROPPED_PAGE_FIELDS[detail]
+    body["pages"] = [
+        {key: value for key, value in page.items() if key not in dropped} if dropped else page
+        for page in page_results
+    ]
+    body["total_extracted_text"] = total_extracted_text
+    return body
+
+
+def _default(value):
+    # numpy scalars from the preprocessing statistics.
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def encode_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    encodings = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    # zstd compresses about as well as gzip in a fraction of the CPU time, so
+    # it wins whenever the client takes it at least as willingly.
+    accepted = accepted_encodings(accept_encoding or "")
+    candidates = [name for name in ("zstd", "gzip") if accepted.get(name, accepted.get("*", 0.0)) > 0]
+    if zstandard is None and "zstd" in candidates:
+        candidates.remove("zstd")
+    if not candidates:
+        return None
+    return max(candidates, key=lambda name: accepted.get(name, accepted.get("*", 0.0)))
+
+
+def encode_body(content: Any, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    body = encode_json(content)
+    encoding = choose_encoding(accept_encoding) if len(body) >= RESPONSE_COMPRESS_MIN_BYTES else None
+    if encoding == "zstd":
+        body = zstandard.ZstdCompressor(level=RESPONSE_ZSTD_LEVEL).compress(body)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL)
+    return body, encoding
+
+
+async def json_response(request: Request, content: Any, detail: str = "full", status_code: int = 200) -> Response:
+    # Serialized and compressed on a worker thread: a full 500-page response
+    # is megabytes of JSON.
+    with RESPONSE_ENCODE_SECONDS.time():
+        body, encoding = await run_in_threadpool(encode_body, content, request.headers.get("accept-encoding", ""))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    RESPONSE_ENCODINGS.labels(encoding or "identity").inc()
+    RESPONSE_BYTES.labels(detail, encoding or "identity").observe(len(body))
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
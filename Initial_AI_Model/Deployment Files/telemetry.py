@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Seconds; spans range from sub-millisecond corrections to multi-minute documents.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds", "Time spent in each pipeline stage.", ["stage"], buckets=LATENCY_BUCKETS
+)
+STAGE_FAILURES = Counter(
+    "pipeline_stage_failures_total", "Pipeline stages that raised an exception.", ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+
+_logging_configured = False
+
+
+class StructuredFormatter(logging.Formatter):
+    # Fields passed as extra={"fields": {...}} become top-level JSON keys, or
+    # key=value pairs in text mode.
+    def __init__(self, json_output: bool = True):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        timestamp = datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds")
+        if self.json_output:
+            entry = {"ts": timestamp, "level": record.levelname, "logger": record.name, "message": record.getMessage(), **fields}
+            if record.exc_info:
+                entry["exception"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+
+        line = f"{timestamp} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(name: str) -> logging.Logger:
+    global _logging_configured
+    if not _logging_configured:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StructuredFormatter(json_output=LOG_FORMAT == "json"))
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(LOG_LEVEL)
+        _logging_configured = True
+    return logging.getLogger(name)
+
+
+def log_event(logger: logging.Logger, level: int, message: str, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields})
+
+
+@contextmanager
+def span(stage: str, timings: Optional[Dict[str, float]] = None, logger: Optional[logging.Logger] = None, **fields):
+    # Records the stage in the Prometheus histogram, accumulates it into the
+    # per-page timings dict when one is given and emits a DEBUG span record.
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_FAILURES.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + elapsed, 6)
+        if logger is not None:
+            log_event(logger, logging.DEBUG, "span", stage=stage, seconds=round(elapsed, 6), **fields)
+
+
+def metrics_registry():
+    # Under a multi-process server every worker writes to PROMETHEUS_MULTIPROC_DIR
+    # and the scrape aggregates them; otherwise the default registry is used.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def instrument_app(app: FastAPI):
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # The route template keeps label cardinality bounded.
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(request.method, route, str(status)).observe(time.perf_counter() - start)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
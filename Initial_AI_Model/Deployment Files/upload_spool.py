@@ -0,0 +1,141 @@
+import os
+import tempfile
+from typing import BinaryIO, Optional, Union
+
+from fastapi import HTTPException
+
+# Largest single PDF accepted (an upload or a ZIP member), and largest request
+# body (every file in a batch together). 0 disables a limit.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(500 * 1024 * 1024)))
+# Documents up to this size stay in memory and are opened with PyMuPDF's
+# stream mode; larger ones spill to a temporary file it can open by path.
+UPLOAD_MEMORY_BYTES = int(os.getenv("UPLOAD_MEMORY_BYTES", str(16 * 1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+CHUNK_SIZE = 1 << 20
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def describe_limit(limit: int) -> str:
+    return f"{limit // (1024 * 1024)} MB" if limit % (1024 * 1024) == 0 else f"{limit} byte"
+
+
+def too_large(limit: int, what: str = "Upload") -> HTTPException:
+    return HTTPException(status_code=413, detail=f"{what} exceeds the {describe_limit(limit)} limit.")
+
+
+# One uploaded PDF, in memory until it grows past UPLOAD_MEMORY_BYTES. Unlike
+# tempfile.SpooledTemporaryFile the spilled file has a name, because PyMuPDF
+# can only open on-disk documents by path (stream mode needs the bytes).
+class UploadSpool:
+    def __init__(self, max_bytes: int = UPLOAD_MAX_BYTES, memory_bytes: int = UPLOAD_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.size = 0
+        self._buffer = bytearray()
+        self._file = None
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise UploadTooLarge(f"Document exceeds the {describe_limit(self.max_bytes)} limit.")
+        if self._file is None and self.size > self.memory_bytes:
+            self._file = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", dir=UPLOAD_SPOOL_DIR)
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.extend(chunk)
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def source(self) -> Union[str, bytearray]:
+        # What ocr_service.open_pdf takes: the spilled file's path, or the bytes.
+        if self._file is not None:
+            self._file.flush()
+            return self._file.name
+        return self._buffer
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = bytearray()
+
+    def __enter__(self) -> "UploadSpool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def spool_stream(stream: BinaryIO, max_bytes: int = UPLOAD_MAX_BYTES) -> UploadSpool:
+    # Copies in chunks so the size limit holds for streams of unknown length,
+    # such as ZIP members that may decompress to far more than they stored.
+    spool = UploadSpool(max_bytes)
+    try:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def keep_uploads_in_memory(memory_bytes: int = UPLOAD_MEMORY_BYTES):
+    # Starlette spools every multipart file to a temporary file past 1 MB
+    # before the endpoint runs. Raise that to our in-memory threshold; the
+    # attribute is spool_max_size since Starlette 0.38 and max_file_size before.
+    from starlette.formparsers import MultiPartParser
+    for attribute in ("spool_max_size", "max_file_size"):
+        if hasattr(MultiPartParser, attribute):
+            setattr(MultiPartParser, attribute, max(getattr(MultiPartParser, attribute), memory_bytes))
+
+
+# Rejects request bodies over the limit with 413 as they stream in: from
+# Content-Length when it is sent, otherwise once the received bytes pass the
+# limit, so an oversized upload is never fully buffered or spooled to /tmp.
+class UploadLimitMiddleware:
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes:
+            await self.app(scope, receive, send)
+            return
+
+        content_length: Optional[bytes] = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so
+                    # this becomes the response instead of a 400.
+                    raise too_large(self.max_bytes, "Request body")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send):
+        body = f'{{"detail":"Request body exceeds the {describe_limit(self.max_bytes)} limit."}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,123 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+# Written by the pre-cache scripts at build time and checked, without any
+# network access, by the OCR service at startup. Standard library only, so it
+# can run before (or without) the heavy dependencies.
+MANIFEST_PATH = os.getenv("PRECACHE_MANIFEST", "/app/precache/manifest.json")
+CHUNK_SIZE = 1 << 20
+
+
+def dataset_key(ds_info: dict) -> str:
+    # "default" is the name datasets gives a dataset's only configuration.
+    variant = ds_info.get("subset") or ds_info.get("config") or ""
+    return f"hf:{ds_info['name']}:{'' if variant == 'default' else variant}"
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def describe_files(paths: Iterable[str]) -> Dict[str, Dict]:
+    return {
+        os.path.abspath(path): {"size": os.path.getsize(path), "sha256": file_digest(path)}
+        for path in sorted(set(paths))
+    }
+
+
+def describe_tree(root: str) -> Dict[str, Dict]:
+    paths = []
+    for directory, _, filenames in os.walk(root):
+        paths.extend(os.path.join(directory, filename) for filename in filenames)
+    return describe_files(paths)
+
+
+def verify_entry(entry: dict, checksums: bool = True) -> List[str]:
+    if entry.get("status") != "ok":
+        return [f"status is {entry.get('status')}: {entry.get('error')}"]
+    if not entry.get("files"):
+        return ["no files recorded"]
+    problems = []
+    for path, expected in entry["files"].items():
+        if not os.path.isfile(path):
+            problems.append(f"missing {path}")
+        elif os.path.getsize(path) != expected["size"]:
+            problems.append(f"size changed {path}")
+        elif checksums and file_digest(path) != expected["sha256"]:
+            problems.append(f"checksum mismatch {path}")
+    return problems
+
+
+class Manifest:
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+
+    def is_complete(self, key: str, checksums: bool = True) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and not verify_entry(entry, checksums)
+
+    def record(self, key: str, entry: dict):
+        # Saved after every entry (atomically), so an interrupted run resumes
+        # from the last completed download.
+        entry = {**entry, "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        with self._lock:
+            self.entries[key] = entry
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": self.entries}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def verify_manifest(path: str = MANIFEST_PATH, required: Iterable[str] = (), checksums: bool = True) -> List[str]:
+    if not os.path.exists(path):
+        return [f"manifest not found: {path}"]
+    try:
+        manifest = Manifest(path)
+    except (OSError, ValueError) as e:
+        return [f"manifest unreadable: {e}"]
+    problems = [f"{key}: not cached" for key in required if key not in manifest.entries]
+    for key in sorted(manifest.entries):
+        problems.extend(f"{key}: {problem}" for problem in verify_entry(manifest.entries[key], checksums))
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verify pre-cached datasets and LanguageTool offline.")
+    parser.add_argument("command", choices=["verify"])
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--require", action="append", default=[], help="Entry that must be present, e.g. languagetool.")
+    parser.add_argument("--sizes-only", action="store_true", help="Skip checksums and only compare file sizes.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    problems = verify_manifest(args.manifest, args.require, checksums=not args.sizes_only)
+    for problem in problems:
+        logging.error(problem)
+    if problems:
+        logging.error(f"Pre-cache verification failed with {len(problems)} problem(s).")
+        return 1
+    logging.info(f"Pre-cache verified: {args.manifest}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,21 @@
 import os
-from datasets import load_dataset
+import sys
+import argparse
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 os.environ['HF_DATASETS_OFFLINE'] = '0'
 
+from datasets import load_dataset
+from cache_manifest import MANIFEST_PATH, Manifest, dataset_key, describe_files
+
+PRECACHE_WORKERS = int(os.getenv("PRECACHE_WORKERS", "4"))
+PRECACHE_ATTEMPTS = int(os.getenv("PRECACHE_ATTEMPTS", "3"))
+
 hf_datasets_to_load = [
     {"name": "math_qa", "trust_remote_code": True, "splits": ["train", "validation", "test"]},
     {"name": "boolq", "splits": ["train", "validation"]},
@@ -25,55 +33,93 @@ hf_datasets_to_load = [
 ]
 
 @retry(
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=10, max=60),
+    stop=stop_after_attempt(PRECACHE_ATTEMPTS),
+    wait=wait_exponential(multiplier=1, min=2, max=30),
     retry=retry_if_exception_type(Exception),
     reraise=True
 )
 def load_and_cache_hf_dataset(name, subset=None, config=None, trust_remote_code=False, splits_to_load=None):
+    # Returns the split names loaded and the Arrow cache files backing them.
     if splits_to_load is None:
         splits_to_load = ['train']
 
-    loaded_at_least_one_split = False
+    loaded_splits = []
+    cache_files = []
     for split in splits_to_load:
         try:
             logging.info(f"    Attempting to load split: '{split}' for {name}" + (f" (subset: {subset})" if subset else "") + (f" (config: {config})" if config else ""))
             if subset:
-                load_dataset(name, subset, split=split, trust_remote_code=trust_remote_code)
+                dataset = load_dataset(name, subset, split=split, trust_remote_code=trust_remote_code)
             elif config:
-                load_dataset(name, config, split=split, trust_remote_code=trust_remote_code)
+                dataset = load_dataset(name, config, split=split, trust_remote_code=trust_remote_code)
             else:
-                load_dataset(name, split=split, trust_remote_code=trust_remote_code)
-            logging.info(f"    Successfully loaded split: '{split}'")
-            loaded_at_least_one_split = True
+                dataset = load_dataset(name, split=split, trust_remote_code=trust_remote_code)
+            logging.info(f"    Successfully loaded split: '{split}' for {name}")
+            loaded_splits.append(split)
+            cache_files.extend(cache_file["filename"] for cache_file in dataset.cache_files)
         except Exception as e:
             if "Unknown split" in str(e):
                 logging.warning(f"    Split '{split}' not found for {name}. Trying next available split. Error: {e}")
             else:
                 raise
 
-    if not loaded_at_least_one_split:
+    if not loaded_splits:
         raise Exception(f"No splits could be loaded for dataset {name}")
+    return loaded_splits, cache_files
 
 
-print("--- Starting Hugging Face Dataset Pre-caching ---")
-
-for ds_info in hf_datasets_to_load:
-    name = ds_info["name"]
-    subset = ds_info.get("subset")
-    config = ds_info.get("config")
-    trust_remote_code = ds_info.get("trust_remote_code", False)
-    splits = ds_info.get("splits")
-
+def pre_cache_dataset(ds_info: dict, manifest: Manifest) -> bool:
+    key = dataset_key(ds_info)
+    start = time.perf_counter()
     try:
-        logging.info(f"Attempting to load and cache dataset: {name}" + (f" (subset: {subset})" if subset else "") + (f" (config: {config})" if config else ""))
-        load_and_cache_hf_dataset(name, subset=subset, config=config, trust_remote_code=trust_remote_code, splits_to_load=splits)
-        logging.info(f"Successfully loaded and cached: {name}" + (f" (subset: {subset})" if subset else "") + (f" (config: {config})" if config else ""))
+        splits, cache_files = load_and_cache_hf_dataset(
+            ds_info["name"],
+            subset=ds_info.get("subset"),
+            config=ds_info.get("config"),
+            trust_remote_code=ds_info.get("trust_remote_code", False),
+            splits_to_load=ds_info.get("splits"),
+        )
+        manifest.record(key, {
+            "kind": "hf_dataset",
+            "status": "ok",
+            "splits": splits,
+            "files": describe_files(cache_files),
+            "seconds": round(time.perf_counter() - start, 1),
+        })
+        logging.info(f"Successfully loaded and cached: {key}")
+        return True
     except Exception as e:
-        logging.error(f"Failed to load and cache dataset {name}" + (f" (subset: {subset})" if subset else "") + f" after multiple retries: {e}")
+        manifest.record(key, {"kind": "hf_dataset", "status": "failed", "error": str(e), "files": {}})
+        logging.error(f"Failed to load and cache dataset {key} after {PRECACHE_ATTEMPTS} attempts: {e}")
+        return False
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Download the Hugging Face datasets used for the domain vocabulary.")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--workers", type=int, default=PRECACHE_WORKERS)
+    parser.add_argument("--force", action="store_true", help="Download again even if the manifest says a dataset is cached.")
+    parser.add_argument("--allow-partial", action="store_true", help="Exit 0 even if some datasets failed.")
+    args = parser.parse_args(argv)
+
+    print("--- Starting Hugging Face Dataset Pre-caching ---")
+    manifest = Manifest(args.manifest)
+    pending = [ds for ds in hf_datasets_to_load if args.force or not manifest.is_complete(dataset_key(ds))]
+    logging.info(f"{len(hf_datasets_to_load) - len(pending)} dataset(s) already cached, {len(pending)} to fetch with {args.workers} worker(s)")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {executor.submit(pre_cache_dataset, ds, manifest): dataset_key(ds) for ds in pending}
+        for future in as_completed(futures):
+            if not future.result():
+                failed.append(futures[future])
 
-    time.sleep(5)
+    print("--- Finished Hugging Face Dataset Pre-caching ---")
+    if failed:
+        logging.error(f"Datasets not cached: {', '.join(sorted(failed))}. Re-run to resume.")
+        return 0 if args.allow_partial else 1
+    return 0
 
-print("--- Finished Hugging Face Dataset Pre-caching ---")
 
-os.environ['HF_DATASETS_OFFLINE'] = '1'
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,44 @@
 import language_tool_python
 import os
+import sys
+import time
 import logging
+from cache_manifest import MANIFEST_PATH, Manifest, describe_tree
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def pre_cache_languagetool():
+MANIFEST_KEY = "languagetool"
+
+def pre_cache_languagetool(manifest_path: str = MANIFEST_PATH):
     cache_dir = os.getenv("LANGUAGE_TOOL_PYTHON_DIR", "/app/languagetool_cache")
     os.makedirs(cache_dir, exist_ok=True)
     language_tool_python.download_lt.DEFAULT_LANGUAGE_TOOL_DIR = cache_dir
 
+    manifest = Manifest(manifest_path)
+    if manifest.is_complete(MANIFEST_KEY):
+        logging.info(f"LanguageTool already cached in {cache_dir}; skipping.")
+        return
+
     logging.info(f"Starting LanguageTool pre-caching to: {cache_dir}")
+    start = time.perf_counter()
     try:
         logging.info("Initializing LanguageTool to cache language data...")
         tool_instance = language_tool_python.LanguageTool('en-US')
-        
-        _ = tool_instance.check("hello world") 
-        
+
+        _ = tool_instance.check("hello world")
+        tool_instance.close()
+
+        manifest.record(MANIFEST_KEY, {
+            "kind": "languagetool",
+            "status": "ok",
+            "files": describe_tree(cache_dir),
+            "seconds": round(time.perf_counter() - start, 1),
+        })
         logging.info("LanguageTool pre-cached successfully.")
     except Exception as e:
+        manifest.record(MANIFEST_KEY, {"kind": "languagetool", "status": "failed", "error": str(e), "files": {}})
         logging.error(f"Failed to pre-cache LanguageTool: {e}")
         raise
 
 if __name__ == "__main__":
-    pre_cache_languagetool()
+    pre_cache_languagetool(sys.argv[1] if len(sys.argv) > 1 else MANIFEST_PATH)
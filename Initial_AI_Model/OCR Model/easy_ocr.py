@@ -1,15 +1,10 @@
 import easyocr
 import torch
 from PIL import Image
-import numpy as np
-import cv2
 import re
-import hashlib
-import io
 import os
 import warnings
-from typing import Dict, List
-from contextlib import contextmanager
+from typing import Callable, Dict, List, Union
 from symspellpy import SymSpell, Verbosity
 from language_tool_python import LanguageTool
 from ocr_utils import (
@@ -17,12 +12,20 @@ from ocr_utils import (
     build_domain_vocabulary,
     calculate_levenshtein_accuracy,
     calculate_domain_confidence,
-    get_language_tool_instance
+    get_language_tool_instance,
+    language_tool_correct,
+    language_tool_issue_count,
+    term_set
 )
+from page_preprocessing import PreprocessedPage, as_preprocessed
+from resource_config import RESOURCES
 
 class EasyOCREngine:
-    def __init__(self, vocabulary: Dict[str, List[str]], spell_checker: None):
+    def __init__(self, vocabulary: Dict[str, List[str]], spell_checker: None,
+                 language_tool_provider: Callable[[], LanguageTool] = get_language_tool_instance):
         warnings.filterwarnings("ignore", category=RuntimeWarning)
+        # Pages run in parallel on the page workers; each gets its share of cores.
+        torch.set_num_threads(RESOURCES.torch_threads)
         self.reader = easyocr.Reader(
             ['en'],
             gpu=False,
@@ -39,50 +42,55 @@ class EasyOCREngine:
         if not self.sym_spell.load_bigram_dictionary(bigram_dict_path, term_index=0, count_index=2):
             print(f"Error: Bigram dictionary not loaded from {bigram_dict_path}")
         
-        self.language_tool = get_language_tool_instance()
+        self.language_tool_provider = language_tool_provider
         self.ocr_cache = {}
 
-    @contextmanager
-    def language_tool_context(self):
-        try:
-            yield self.language_tool
-        finally:
-            pass
-
     def _preprocess(self, image: Image.Image) -> Image.Image:
-        img_np = np.array(image)
-        gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-        return Image.fromarray(thresh)
+        # EasyOCR's detector works on grayscale; hard binarization loses thin strokes.
+        return as_preprocessed(image).clean_image()
 
     def _postprocess(self, ocr_result: List[Dict]) -> str:
-        extracted_text_parts = []
-        for (bbox, text, prob) in ocr_result:
-            if text:
-                extracted_text_parts.append(text)
-        return " ".join(extracted_text_parts)
+        # Detections whose vertical centre falls inside a line's span join that
+        # line, left to right, so the text keeps its lines (running headers and
+        # footers are found line by line).
+        lines = []
+        for (bbox, text, prob) in sorted(ocr_result, key=lambda item: min(point[1] for point in item[0])):
+            if not text:
+                continue
+            top = min(point[1] for point in bbox)
+            bottom = max(point[1] for point in bbox)
+            left = min(point[0] for point in bbox)
+            centre = (top + bottom) / 2
+            if lines and lines[-1]["top"] <= centre <= lines[-1]["bottom"]:
+                lines[-1]["words"].append((left, text))
+                lines[-1]["bottom"] = max(lines[-1]["bottom"], bottom)
+            else:
+                lines.append({"top": top, "bottom": bottom, "words": [(left, text)]})
+        return "\n".join(" ".join(text for _, text in sorted(line["words"])) for line in lines)
 
-    def perform_ocr(self, image: Image.Image, ocr_quality: str = 'high') -> str:
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format=image.format or 'PNG')
-        img_hash = hashlib.md5(img_byte_arr.getvalue()).hexdigest()
+    def perform_ocr(self, image: Union[Image.Image, PreprocessedPage], ocr_quality: str = 'high') -> str:
+        page = as_preprocessed(image)
+        img_hash = page.digest()
 
         if img_hash in self.ocr_cache:
             return self.ocr_cache[img_hash]
 
         if ocr_quality == 'high':
-            ocr_result = self.reader.readtext(np.array(image))
+            ocr_result = self.reader.readtext(page.clean())
         else:
-            ocr_result = self.reader.readtext(np.array(image))
+            ocr_result = self.reader.readtext(page.gray())
 
         text = self._postprocess(ocr_result)
         self.ocr_cache[img_hash] = text
         return text
 
     def correct_text(self, text: str, domain: str = None) -> str:
+        return self.correct_grammar(self.spell_correct(text, domain))
+
+    def spell_correct(self, text: str, domain: str = None) -> str:
         domain_terms = set()
         if domain and domain in self.vocabulary:
-            domain_terms.update(self.vocabulary[domain])
+            domain_terms = term_set(self.vocabulary[domain])
 
         words_and_delimiters = re.findall(r'(\w+|[^\w\s]+|\s+)', text)
         corrected_parts = []
@@ -117,13 +125,13 @@ class EasyOCREngine:
             else:
                 corrected_parts.append(part)
 
-        basic_corrected = "".join(corrected_parts)
-        with self.language_tool_context() as lt:
-            return lt.correct(basic_corrected)
+        return "".join(corrected_parts)
+
+    def correct_grammar(self, text: str) -> str:
+        return language_tool_correct(self.language_tool_provider, text)
 
     def check_grammar(self, text: str) -> int:
-        with self.language_tool_context() as lt:
-            return len(lt.check(text))
+        return language_tool_issue_count(self.language_tool_provider, text)
 
     def calculate_accuracy(self, pred: str, truth: str) -> float:
         return calculate_levenshtein_accuracy(pred, truth)
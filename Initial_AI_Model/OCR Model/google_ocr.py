@@ -3,11 +3,9 @@ import io
 from typing import Optional
 from dataclasses import dataclass
 from PIL import Image
-import numpy as np
 from spellchecker import SpellChecker
 from google.cloud import vision
 from language_tool_python import LanguageTool
-from contextlib import contextmanager
 import re
 from collections import defaultdict
 from ocr_utils import (
@@ -16,10 +14,14 @@ from ocr_utils import (
     enhance_spellchecker,
     calculate_levenshtein_accuracy,
     calculate_domain_confidence,
-    get_language_tool_instance
+    get_language_tool_instance,
+    language_tool_correct,
+    language_tool_issue_count,
+    term_set
 )
-from typing import Dict, List
-import cv2
+from page_preprocessing import PreprocessedPage, as_preprocessed
+from page_layout import stack_regions, region_at
+from typing import Callable, Dict, List, Union
 
 @dataclass
 class OCRResult:
@@ -36,54 +38,59 @@ class OCRConfig:
         self.USE_GOOGLE_VISION = True
 
 class GoogleVisionEngine:
-    def __init__(self, config: OCRConfig, vocabulary: Dict[str, List[str]], spell_checker: SpellChecker):
+    def __init__(self, config: OCRConfig, vocabulary: Dict[str, List[str]], spell_checker: SpellChecker,
+                 language_tool_provider: Callable[[], LanguageTool] = get_language_tool_instance):
         self.name = "GoogleVision"
         self.config = config
         os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = self.config.GOOGLE_CREDENTIALS_PATH
         self.client = vision.ImageAnnotatorClient()
         self.vocabulary = vocabulary
         self.spell = spell_checker
-        self.language_tool = get_language_tool_instance()
+        self.language_tool_provider = language_tool_provider
         self.ocr_cache = {}
 
-    @contextmanager
-    def language_tool_context(self):
-        try:
-            yield self.language_tool
-        finally:
-            pass
+    def reconnect(self):
+        # gRPC channels do not survive fork(); forked workers need their own client.
+        self.client = vision.ImageAnnotatorClient()
 
     def _preprocess(self, image: Image.Image) -> Image.Image:
-        img_np = np.array(image)
-        if img_np.shape[2] == 4:
-            img_np = cv2.cvtColor(img_np, cv2.COLOR_RGBA2RGB)
-        if img_np.shape[2] == 3 and img_np.shape[2] != image.mode.count('RGB'):
-            img = Image.fromarray(img_np)
-            return img.convert('RGB')
-        return Image.fromarray(img_np)
-
-    def _prepare_image_bytes(self, image: Image.Image) -> bytes:
+        return as_preprocessed(image).clean_image()
+
+    def _detect(self, image_bytes: bytes):
+        # Errors are raised rather than read as a blank page, so callers can
+        # tell a dead API (bad credentials, quota, outage) from an empty image.
+        response = self.client.document_text_detection(image=vision.Image(content=image_bytes))
+        if response.error.message:
+            raise RuntimeError(f"Google Vision API error: {response.error.message}")
+        return response
+
+    def run(self, image: Union[Image.Image, PreprocessedPage]) -> str:
+        # A single-channel PNG of the cleaned page is a third of the RGB upload.
+        response = self._detect(as_preprocessed(image).png_bytes("clean"))
+        return response.full_text_annotation.text if response.full_text_annotation else ""
+
+    def run_regions(self, regions: List[PreprocessedPage]) -> List[str]:
+        # Vision bills per image, so the regions are stacked on one canvas and
+        # sent as a single request; each word goes back to the region its
+        # bounding box falls in.
+        canvas, offsets = stack_regions([region.clean() for region in regions])
         img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        return img_byte_arr.getvalue()
-
-    def run(self, image: Image.Image) -> str:
-        processed_image = self._preprocess(image)
-        image_bytes = self._prepare_image_bytes(processed_image)
-
-        try:
-            image_vision = vision.Image(content=image_bytes)
-            response = self.client.document_text_detection(image=image_vision)
-            raw_text = response.full_text_annotation.text if response.full_text_annotation else ""
-            return raw_text
-        except Exception as e:
-            print(f"Error during Google Vision API call: {e}")
-            return ""
+        Image.fromarray(canvas).save(img_byte_arr, format='PNG')
+        response = self._detect(img_byte_arr.getvalue())
+
+        words = [[] for _ in regions]
+        # The first annotation is the whole text; the rest are single words in reading order.
+        for annotation in response.text_annotations[1:]:
+            vertices = annotation.bounding_poly.vertices
+            center = sum(vertex.y for vertex in vertices) / max(1, len(vertices))
+            words[region_at(offsets, center)].append(annotation.description)
+        return [" ".join(region_words) for region_words in words]
 
     def correct_spelling(self, text: str) -> str:
-        domain_terms = set()
-        for domain_list in self.vocabulary.values():
-            domain_terms.update(domain_list)
+        return self.correct_grammar(self.spell_correct(text))
+
+    def spell_correct(self, text: str) -> str:
+        domain_term_sets = [term_set(domain_list) for domain_list in self.vocabulary.values()]
 
         words = re.split(r'(\s+)', text)
         corrected_parts = []
@@ -94,7 +101,7 @@ class GoogleVisionEngine:
 
             clean_word = re.sub(r'^\W+|\W+$', '', part).lower()
 
-            if clean_word in domain_terms:
+            if any(clean_word in terms for terms in domain_term_sets):
                 corrected_parts.append(part)
             elif clean_word.isalpha() and len(clean_word) > 2:
                 correction = self.spell.correction(clean_word)
@@ -110,13 +117,13 @@ class GoogleVisionEngine:
             else:
                 corrected_parts.append(part)
 
-        basic_corrected = "".join(corrected_parts)
-        with self.language_tool_context() as lt:
-            return lt.correct(basic_corrected)
+        return "".join(corrected_parts)
+
+    def correct_grammar(self, text: str) -> str:
+        return language_tool_correct(self.language_tool_provider, text)
 
     def check_grammar(self, text: str) -> int:
-        with self.language_tool_context() as lt:
-            return len(lt.check(text))
+        return language_tool_issue_count(self.language_tool_provider, text)
 
     def calculate_accuracy(self, pred: str, truth: str) -> float:
         return calculate_levenshtein_accuracy(pred, truth)
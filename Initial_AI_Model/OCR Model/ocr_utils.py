@@ -4,6 +4,8 @@ from typing import List, Dict, Optional
 from spellchecker import SpellChecker
 from rapidfuzz import fuzz
 import os
+from array import array
+from typing import Callable, Iterable, Iterator, Union
 from language_tool_python import LanguageTool, download_lt
 
 download_lt.DEFAULT_LANGUAGE_TOOL_DIR = "/app/languagetool_cache"
@@ -12,6 +14,58 @@ from datasets import load_dataset as hf_load_dataset
 
 _language_tool_instance = None
 
+class CompactTermSet:
+    # Read-only set of terms packed into one sorted bytes blob plus an offsets
+    # array. Lookups binary-search the blob, so reading it never touches the
+    # reference counts of millions of small str objects; in a pre-forked server
+    # the pages stay shared copy-on-write between workers.
+    __slots__ = ("_blob", "_offsets")
+
+    def __init__(self, terms: Iterable[str]):
+        encoded = sorted({term.encode("utf-8") for term in terms if term})
+        self._blob = b"".join(encoded)
+        self._offsets = array("Q", [0])
+        position = 0
+        for term in encoded:
+            position += len(term)
+            self._offsets.append(position)
+
+    def _term(self, index: int) -> bytes:
+        return self._blob[self._offsets[index]:self._offsets[index + 1]]
+
+    def __contains__(self, word) -> bool:
+        if not isinstance(word, str):
+            return False
+        target = word.encode("utf-8")
+        lo, hi = 0, len(self._offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            term = self._term(mid)
+            if term < target:
+                lo = mid + 1
+            elif term > target:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self._term(index).decode("utf-8")
+
+def compact_vocabulary(vocabulary: Dict[str, List[str]]) -> Dict[str, CompactTermSet]:
+    return {domain: CompactTermSet(terms) for domain, terms in vocabulary.items()}
+
+def term_set(terms: Union[List[str], set, CompactTermSet]):
+    # Plain term lists (e.g. straight from build_domain_vocabulary) are turned
+    # into a set for O(1) lookups; compact and set vocabularies are used as is.
+    if isinstance(terms, (set, frozenset, CompactTermSet)):
+        return terms
+    return set(terms)
+
 def load_dataset(filepath: str = "/app/datasets/dataset.json") -> List[Dict]:
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
@@ -145,8 +199,12 @@ def get_language_tool_instance():
     if _language_tool_instance is None:
         try:
             print("Creating new LanguageTool instance...")
+            remote_server = os.getenv('LANGUAGE_TOOL_REMOTE_SERVER')
             lang_tool_path = os.getenv('LANGUAGE_TOOL_PATH', os.path.join(download_lt.DEFAULT_LANGUAGE_TOOL_DIR, 'LanguageTool'))
-            if os.path.exists(os.path.join(lang_tool_path, 'LanguageTool.jar')):
+            if remote_server:
+                # A shared LanguageTool server (sidecar or pre-fork parent) instead of one JVM per process.
+                _language_tool_instance = LanguageTool('en-US', remote_server=remote_server)
+            elif os.path.exists(os.path.join(lang_tool_path, 'LanguageTool.jar')):
                 _language_tool_instance = LanguageTool('en-US', language_tool_path=lang_tool_path)
             else:
                 _language_tool_instance = LanguageTool('en-US')
@@ -156,6 +214,20 @@ def get_language_tool_instance():
             _language_tool_instance = None
     return _language_tool_instance
 
+# Engines hold a provider rather than the tool itself and call it at grammar
+# time, so building an engine never waits for the LanguageTool JVM.
+def _language_tool_from(provider: Callable[[], Optional[LanguageTool]]) -> LanguageTool:
+    tool = provider()
+    if tool is None:
+        raise RuntimeError("LanguageTool is not available")
+    return tool
+
+def language_tool_correct(provider: Callable[[], Optional[LanguageTool]], text: str) -> str:
+    return _language_tool_from(provider).correct(text)
+
+def language_tool_issue_count(provider: Callable[[], Optional[LanguageTool]], text: str) -> int:
+    return len(_language_tool_from(provider).check(text))
+
 
 if __name__ == "__main__":
     print("Running ocr_utils.py example with Hugging Face datasets:")
@@ -0,0 +1,204 @@
+import math
+import os
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from page_preprocessing import PreprocessedPage
+
+BBox = Tuple[int, int, int, int]
+
+# Regions smaller than this fraction of the page are specks, page numbers
+# cut in half or scan dirt; OCRing them costs an engine call for nothing.
+MIN_REGION_AREA = float(os.getenv("LAYOUT_MIN_REGION_AREA", "0.0005"))
+# Past this many regions the page is too fragmented to be worth splitting.
+MAX_REGIONS = int(os.getenv("LAYOUT_MAX_REGIONS", "40"))
+REGION_PADDING = 4
+FIGURE_INK_DENSITY = 0.35
+EQUATION_SYMBOL_RATIO = 0.2
+# A PDF page whose only content is one image this large is a scan.
+SCANNED_IMAGE_COVERAGE = 0.5
+STACK_GAP = 24
+
+MATH_SYMBOLS = set("=+−×÷±∑∏∫√∞≈≠≤≥∂∇∈∉⊂⊆∪∩→←↔⇒αβγδεζηθλμνξπρστφχψωΓΔΘΛΞΠΣΦΨΩ^_{}|")
+
+
+@dataclass
+class Region:
+    bbox: BBox
+    kind: str = "prose"
+    index: int = 0
+    text_hint: str = ""
+    text: str = ""
+    engine: Optional[str] = None
+    attempts: List[str] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "index": self.index,
+            "kind": self.kind,
+            "bbox": list(self.bbox),
+            "engine": self.engine,
+            "attempts": list(self.attempts),
+            "chars": len(self.text),
+        }
+
+
+def math_symbol_ratio(text: str) -> float:
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    return sum(c in MATH_SYMBOLS for c in chars) / len(chars)
+
+
+def text_kind(text: str) -> str:
+    return "equation" if math_symbol_ratio(text) >= EQUATION_SYMBOL_RATIO and len(text.split()) < 40 else "prose"
+
+
+def _clip(bbox: Sequence[float], width: int, height: int) -> Optional[BBox]:
+    x0 = max(0, int(math.floor(bbox[0])) - REGION_PADDING)
+    y0 = max(0, int(math.floor(bbox[1])) - REGION_PADDING)
+    x1 = min(width, int(math.ceil(bbox[2])) + REGION_PADDING)
+    y1 = min(height, int(math.ceil(bbox[3])) + REGION_PADDING)
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    return x0, y0, x1, y1
+
+
+def regions_from_pdf(pdf_blocks: Sequence[tuple], scale: float, width: int, height: int) -> List[Region]:
+    # PyMuPDF already knows the blocks of a born-digital page (page.get_text("blocks")).
+    # An empty list means the page is a scan (or blank) and has to be segmented from pixels.
+    regions = []
+    image_area = 0
+    for x0, y0, x1, y1, text, _, block_type in pdf_blocks:
+        bbox = _clip((x0 * scale, y0 * scale, x1 * scale, y1 * scale), width, height)
+        if bbox is None:
+            continue
+        if block_type == 1:
+            image_area += (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+            regions.append(Region(bbox, kind="figure"))
+        elif text.strip():
+            regions.append(Region(bbox, kind=text_kind(text), text_hint=text))
+    if not any(region.kind != "figure" for region in regions) and image_area >= SCANNED_IMAGE_COVERAGE * width * height:
+        return []
+    return regions
+
+
+def regions_from_image(binary: np.ndarray) -> List[Region]:
+    # Smear ink horizontally across word gaps and vertically across line gaps
+    # but not paragraph or column gaps; each connected blob is one block.
+    height, width = binary.shape
+    ink = cv2.bitwise_not(binary)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, width // 60), max(3, height // 150)))
+    blocks = cv2.dilate(ink, kernel)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(blocks, connectivity=8)
+    min_area = MIN_REGION_AREA * width * height
+    regions = []
+    for x, y, w, h, _ in stats[1:count]:
+        if w * h < min_area:
+            continue
+        bbox = _clip((x, y, x + w, y + h), width, height)
+        if bbox is not None:
+            regions.append(Region(bbox))
+    return regions
+
+
+def _ruling_lines(ink: np.ndarray, horizontal: bool) -> int:
+    height, width = ink.shape
+    size = (max(10, width // 3), 1) if horizontal else (1, max(10, height // 3))
+    lines = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, size))
+    count, _ = cv2.connectedComponents(lines)
+    return count - 1
+
+
+def classify_region(binary: np.ndarray, region: Region) -> str:
+    if region.kind != "prose":
+        return region.kind
+    x0, y0, x1, y1 = region.bbox
+    ink = cv2.bitwise_not(binary[y0:y1, x0:x1])
+    if ink.shape[0] >= 20 and ink.shape[1] >= 20:
+        rows = _ruling_lines(ink, horizontal=True)
+        columns = _ruling_lines(ink, horizontal=False)
+        if rows >= 2 and (columns >= 2 or rows >= 3):
+            return "table"
+    if float(ink.mean()) / 255.0 >= FIGURE_INK_DENSITY:
+        return "figure"
+    return "prose"
+
+
+def reading_order(regions: List[Region], width: int) -> List[Region]:
+    # Top to bottom, except that two-column stretches read the left column
+    # before the right one. A full-width block ends the stretch above it.
+    middle = width / 2.0
+    tolerance = width * 0.02
+
+    def column(region: Region) -> int:
+        x0, _, x1, _ = region.bbox
+        if x1 <= middle + tolerance:
+            return 0
+        if x0 >= middle - tolerance:
+            return 1
+        return -1
+
+    ordered = []
+    band = []
+    for region in sorted(regions, key=lambda r: (r.bbox[1], r.bbox[0])):
+        if column(region) == -1:
+            ordered.extend(sorted(band, key=lambda r: (column(r), r.bbox[1])))
+            band = []
+            ordered.append(region)
+        else:
+            band.append(region)
+    ordered.extend(sorted(band, key=lambda r: (column(r), r.bbox[1])))
+    for index, region in enumerate(ordered):
+        region.index = index
+    return ordered
+
+
+def whole_page(page: PreprocessedPage) -> List[Region]:
+    height, width = page.gray().shape
+    return [Region((0, 0, width, height))]
+
+
+def detect_regions(page: PreprocessedPage, pdf_blocks: Optional[Sequence[tuple]] = None, dpi: int = 150) -> List[Region]:
+    binary = page.binary()
+    height, width = binary.shape
+    regions = []
+    # After deskewing, PDF coordinates no longer line up with the pixels.
+    if pdf_blocks and "deskew" not in page.steps:
+        regions = regions_from_pdf(pdf_blocks, dpi / 72.0, width, height)
+    if not regions:
+        regions = regions_from_image(binary)
+    if not regions or len(regions) > MAX_REGIONS:
+        return whole_page(page)
+    for region in regions:
+        region.kind = classify_region(binary, region)
+    return reading_order(regions, width)
+
+
+def stitch(regions: List[Region], texts: Optional[List[str]] = None) -> str:
+    texts = texts if texts is not None else [region.text for region in regions]
+    return "\n\n".join(text.strip() for text in texts if text and text.strip())
+
+
+def stack_regions(images: List[np.ndarray], gap: int = STACK_GAP) -> Tuple[np.ndarray, List[int]]:
+    # Lays region crops out top to bottom on one white canvas so an engine
+    # billed per image reads them all in a single request. Returns the canvas
+    # and the y offset where each crop starts, for mapping results back.
+    width = max(image.shape[1] for image in images)
+    height = sum(image.shape[0] for image in images) + gap * (len(images) - 1)
+    canvas = np.full((height, width), 255, dtype=np.uint8)
+    offsets = []
+    y = 0
+    for image in images:
+        canvas[y:y + image.shape[0], :image.shape[1]] = image
+        offsets.append(y)
+        y += image.shape[0] + gap
+    return canvas, offsets
+
+
+def region_at(offsets: List[int], y: float) -> int:
+    return max(0, bisect_right(offsets, y) - 1)
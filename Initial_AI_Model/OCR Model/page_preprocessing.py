@@ -0,0 +1,169 @@
+import hashlib
+import os
+from typing import Dict, List, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from resource_config import RESOURCES
+
+# OpenCV's own pool would otherwise spread every page across all cores while
+# the page workers already run pages in parallel.
+cv2.setNumThreads(RESOURCES.opencv_threads)
+
+# Below these the page is treated as clean and the step is skipped.
+MIN_SKEW_DEGREES = float(os.getenv("PREPROCESS_MIN_SKEW_DEGREES", "0.3"))
+MAX_SKEW_DEGREES = float(os.getenv("PREPROCESS_MAX_SKEW_DEGREES", "10"))
+NOISE_SIGMA_THRESHOLD = float(os.getenv("PREPROCESS_NOISE_SIGMA", "4"))
+# Above this the cheap median filter is not enough and non-local means is used;
+# the small windows keep it around 0.4s on a 150 dpi page instead of ~2.5s.
+HEAVY_NOISE_SIGMA = float(os.getenv("PREPROCESS_HEAVY_NOISE_SIGMA", "10"))
+SKEW_ESTIMATE_WIDTH = 1000
+
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+
+def estimate_noise_sigma(gray: np.ndarray) -> float:
+    # Immerkaer's Laplacian-difference kernel cancels smooth image structure;
+    # the median response ignores the minority of pixels on text edges. For
+    # Gaussian noise the response has standard deviation 6 * sigma.
+    height, width = gray.shape
+    if height < 3 or width < 3:
+        return 0.0
+    response = cv2.filter2D(gray.astype(np.float32), -1, _NOISE_KERNEL, borderType=cv2.BORDER_REPLICATE)
+    return float(np.median(np.abs(response[1:-1, 1:-1])) / (0.6745 * 6.0))
+
+
+def _profile_sharpness(xs: np.ndarray, ys: np.ndarray, angles: np.ndarray, bins: int) -> np.ndarray:
+    # Text lines give a spiky horizontal projection when the page is level.
+    scores = np.empty(len(angles))
+    for i, angle in enumerate(np.deg2rad(angles)):
+        projected = ys * np.cos(angle) - xs * np.sin(angle)
+        profile = np.bincount((projected - projected.min()).astype(np.int32), minlength=bins)
+        scores[i] = np.square(np.diff(profile.astype(np.float64))).sum()
+    return scores
+
+
+def estimate_skew_degrees(gray: np.ndarray) -> float:
+    # Projection-profile search on a downscaled copy, coarse then fine. Scan
+    # speckle spreads evenly over every projection, so it barely moves the peak.
+    scale = min(1.0, SKEW_ESTIMATE_WIDTH / gray.shape[1])
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+    _, ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    ys, xs = np.nonzero(ink)
+    if len(xs) < 100:
+        return 0.0
+    xs = xs.astype(np.float64)
+    ys = ys.astype(np.float64)
+    bins = int(np.hypot(*small.shape)) + 2
+
+    coarse = np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + 0.5, 0.5)
+    best = coarse[np.argmax(_profile_sharpness(xs, ys, coarse, bins))]
+    fine = np.arange(best - 0.5, best + 0.55, 0.05)
+    best = fine[np.argmax(_profile_sharpness(xs, ys, fine, bins))]
+    # The projection angle that lines the text up is also the rotation that
+    # levels it: deskew() rotates by exactly this.
+    return float(best)
+
+
+def deskew(gray: np.ndarray, angle: float) -> np.ndarray:
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_LINEAR, borderValue=255)
+
+
+def denoise(gray: np.ndarray, sigma: float) -> np.ndarray:
+    if sigma >= HEAVY_NOISE_SIGMA:
+        return cv2.fastNlMeansDenoising(gray, None, h=min(sigma, 30.0), templateWindowSize=5, searchWindowSize=7)
+    return cv2.medianBlur(gray, 3)
+
+
+# One page's preprocessing, computed lazily and at most once: each engine asks
+# for the variant it needs (EasyOCR and Google Vision the cleaned grayscale,
+# Tesseract the binarized page) and later fallbacks reuse the work.
+class PreprocessedPage:
+    def __init__(self, image: Union[Image.Image, np.ndarray]):
+        self.image = image if isinstance(image, Image.Image) else Image.fromarray(image)
+        self.steps: List[str] = []
+        self.noise_sigma = None
+        self.skew_degrees = None
+        self._variants: Dict[str, object] = {}
+
+    def gray(self) -> np.ndarray:
+        if "gray" not in self._variants:
+            image = self.image
+            if image.mode == "L":
+                self._variants["gray"] = np.asarray(image)
+            else:
+                self._variants["gray"] = cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2GRAY)
+        return self._variants["gray"]
+
+    def clean(self) -> np.ndarray:
+        if "clean" not in self._variants:
+            gray = self.gray()
+            self.noise_sigma = round(estimate_noise_sigma(gray), 3)
+            if self.noise_sigma >= NOISE_SIGMA_THRESHOLD:
+                gray = denoise(gray, self.noise_sigma)
+                self.steps.append("denoise")
+            self.skew_degrees = round(estimate_skew_degrees(gray), 3)
+            if abs(self.skew_degrees) >= MIN_SKEW_DEGREES:
+                gray = deskew(gray, self.skew_degrees)
+                self.steps.append("deskew")
+            self._variants["clean"] = gray
+        return self._variants["clean"]
+
+    def binary(self) -> np.ndarray:
+        if "binary" not in self._variants:
+            _, thresh = cv2.threshold(self.clean(), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+            self.steps.append("binarize")
+            self._variants["binary"] = thresh
+        return self._variants["binary"]
+
+    def clean_image(self) -> Image.Image:
+        return Image.fromarray(self.clean())
+
+    def binary_image(self) -> Image.Image:
+        return Image.fromarray(self.binary())
+
+    def png_bytes(self, variant: str = "clean") -> bytes:
+        key = f"png:{variant}"
+        if key not in self._variants:
+            ok, encoded = cv2.imencode(".png", getattr(self, variant)())
+            if not ok:
+                raise ValueError(f"Could not encode the {variant} page as PNG.")
+            self._variants[key] = encoded.tobytes()
+        return self._variants[key]
+
+    def digest(self, variant: str = "gray") -> str:
+        # Hashes raw pixels instead of an encoded PNG; used as the OCR cache key.
+        key = f"digest:{variant}"
+        if key not in self._variants:
+            pixels = np.ascontiguousarray(getattr(self, variant)())
+            digest = hashlib.md5(str(pixels.shape).encode("utf-8"))
+            digest.update(pixels.data)
+            self._variants[key] = digest.hexdigest()
+        return self._variants[key]
+
+    def crop(self, bbox: Tuple[int, int, int, int]) -> "PreprocessedPage":
+        # A region of an already-cleaned page: reuses the page's cleaned and
+        # binarized pixels instead of estimating noise and skew again.
+        x0, y0, x1, y1 = bbox
+        height, width = self.clean().shape
+        if (x0, y0, x1, y1) == (0, 0, width, height):
+            return self
+        pixels = np.ascontiguousarray(self.clean()[y0:y1, x0:x1])
+        region = PreprocessedPage(pixels)
+        region._variants["gray"] = region._variants["clean"] = pixels
+        region._variants["binary"] = np.ascontiguousarray(self.binary()[y0:y1, x0:x1])
+        region.steps = list(self.steps)
+        region.noise_sigma = self.noise_sigma
+        region.skew_degrees = self.skew_degrees
+        return region
+
+    def summary(self) -> Dict[str, object]:
+        return {"steps": list(self.steps), "noise_sigma": self.noise_sigma, "skew_degrees": self.skew_degrees}
+
+
+def as_preprocessed(image: Union[Image.Image, np.ndarray, PreprocessedPage]) -> PreprocessedPage:
+    return image if isinstance(image, PreprocessedPage) else PreprocessedPage(image)
@@ -0,0 +1,182 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional, Tuple
+
+# Central CPU budget for one node. EasyOCR's torch threads, Tesseract's OpenMP
+# threads, OpenCV, the LanguageTool JVM and the classifier's torch threads all
+# size themselves to the whole machine by default; on a shared node that
+# oversubscribes the cores as soon as pages run in parallel. Every service
+# reads its share from RESOURCES instead.
+#
+# Importing this module exports the thread limits that native libraries only
+# read once, when they load (OpenMP/MKL, the JVM), so import it before torch.
+# Explicit environment variables always win over the computed plan, then a
+# profile written by Benchmarks/tune_resources.py, then the defaults below.
+
+RESOURCE_PROFILE = os.getenv("RESOURCE_PROFILE", "/app/resource_profile.json")
+# "prefork" (set by prefork_server.py) splits the OCR cores across processes;
+# a single uvicorn process gives them all to its page workers.
+OCR_PROCESS_MODEL = os.getenv("OCR_PROCESS_MODEL", "single")
+# Which share this process exports to its native libraries: "ocr" (per-page
+# threads, the LanguageTool JVM) or "classifier" (set by classification_service.py).
+RESOURCE_ROLE = os.getenv("RESOURCE_ROLE", "ocr")
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_DIRS = ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct")
+
+# Settings a profile (or the environment) may pin; the environment variable
+# names are the ones the services already used.
+ENV_OVERRIDES = {
+    "ocr_workers": "OCR_WORKERS",
+    "page_workers": "PAGE_WORKERS",
+    "torch_threads": "WORKER_TORCH_THREADS",
+    "tesseract_threads": "TESSERACT_THREADS",
+    "opencv_threads": "OPENCV_THREADS",
+    "languagetool_cpus": "RESOURCE_LANGUAGETOOL_CPUS",
+    "classifier_threads": "TORCH_NUM_THREADS",
+    "classifier_interop_threads": "TORCH_INTEROP_THREADS",
+}
+
+
+@dataclass
+class ResourcePlan:
+    cpus: int
+    cpu_source: str
+    process_model: str
+    # OCR node: pre-forked processes, page threads per process, and the
+    # native threads each page may use.
+    ocr_workers: int
+    page_workers: int
+    torch_threads: int
+    tesseract_threads: int
+    opencv_threads: int
+    # The one LanguageTool JVM shared by every OCR worker.
+    languagetool_cpus: int
+    # Classification service; 0 interop threads leaves torch's default.
+    classifier_threads: int
+    classifier_interop_threads: int
+    profile: Optional[str] = None
+    overrides: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    # CPUs the container may use per scheduling period, or None if unlimited.
+    cpu_max = _read(CGROUP_V2_CPU_MAX)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    for directory in CGROUP_V1_DIRS:
+        quota = _read(os.path.join(directory, "cpu.cfs_quota_us"))
+        period = _read(os.path.join(directory, "cpu.cfs_period_us"))
+        if quota and period and int(quota) > 0:
+            return int(quota) / int(period)
+    return None
+
+
+def detect_cpus() -> Tuple[int, str]:
+    if os.getenv("RESOURCE_CPUS"):
+        return max(1, int(os.environ["RESOURCE_CPUS"])), "override"
+    try:
+        cpus, source = len(os.sched_getaffinity(0)), "affinity"
+    except AttributeError:
+        cpus, source = os.cpu_count() or 1, "cpu_count"
+    quota = cgroup_cpu_quota()
+    if quota is not None and quota < cpus:
+        # Round down: a fractional core is better left idle than oversubscribed.
+        cpus, source = max(1, int(quota)), "cgroup"
+    return cpus, source
+
+
+def load_profile(path: str, cpus: int) -> Dict[str, int]:
+    # A tuned profile only applies to the core count it was measured on.
+    text = _read(path)
+    if not text:
+        return {}
+    profile = json.loads(text)
+    if profile.get("cpus") != cpus:
+        return {}
+    return {name: int(value) for name, value in profile.get("settings", {}).items() if name in ENV_OVERRIDES}
+
+
+def plan_resources(cpus: int = None, cpu_source: str = "override", process_model: str = OCR_PROCESS_MODEL,
+                   profile_path: str = RESOURCE_PROFILE, environ: Dict[str, str] = None) -> ResourcePlan:
+    if cpus is None:
+        cpus, cpu_source = detect_cpus()
+    environ = os.environ if environ is None else environ
+    pinned = load_profile(profile_path, cpus) if profile_path else {}
+    profile = profile_path if pinned else None
+    for name, variable in ENV_OVERRIDES.items():
+        # 0 keeps meaning "choose for me", as it did for OCR_WORKERS and PAGE_WORKERS.
+        if int(environ.get(variable, "0") or "0") > 0:
+            pinned[name] = int(environ[variable])
+
+    def pick(name: str, default: int) -> int:
+        return max(1, pinned.get(name, default))
+
+    # The JVM is only busy during correction, so it gets a small slice, and
+    # cores reserved for a classifier on the same node are left alone.
+    languagetool_cpus = pick("languagetool_cpus", max(1, cpus // 8))
+    classifier_cpus = int(environ.get("RESOURCE_CLASSIFIER_CPUS", "0") or "0")
+    ocr_cpus = max(1, cpus - languagetool_cpus - classifier_cpus)
+
+    # Whole pages in parallel scale better than intra-op threads on one page:
+    # one process per core and one thread per page unless told otherwise.
+    ocr_workers = pick("ocr_workers", ocr_cpus if process_model == "prefork" else 1)
+    per_worker = max(1, ocr_cpus // ocr_workers)
+    page_workers = pick("page_workers", per_worker)
+    per_page = max(1, per_worker // page_workers)
+
+    return ResourcePlan(
+        cpus=cpus,
+        cpu_source=cpu_source,
+        process_model=process_model,
+        ocr_workers=ocr_workers,
+        page_workers=page_workers,
+        torch_threads=pick("torch_threads", per_page),
+        tesseract_threads=pick("tesseract_threads", 1),
+        opencv_threads=pick("opencv_threads", per_page),
+        languagetool_cpus=languagetool_cpus,
+        classifier_threads=pick("classifier_threads", classifier_cpus or cpus),
+        classifier_interop_threads=max(0, pinned.get("classifier_interop_threads", 0)),
+        profile=profile,
+        overrides=dict(pinned),
+    )
+
+
+def export_environment(plan: ResourcePlan, role: str = RESOURCE_ROLE):
+    # setdefault throughout: anything set explicitly by the deployment stays.
+    # OpenMP and MKL pools outside torch read these, so the classifier gets
+    # its own thread count rather than an OCR page's.
+    threads = plan.classifier_threads if role == "classifier" else plan.torch_threads
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(threads))
+    if role == "classifier":
+        return
+    java_options = os.environ.get("JAVA_TOOL_OPTIONS", "")
+    if "ActiveProcessorCount" not in java_options:
+        # Sizes the LanguageTool JVM's GC and worker pools to its share.
+        os.environ["JAVA_TOOL_OPTIONS"] = f"{java_options} -XX:ActiveProcessorCount={plan.languagetool_cpus}".strip()
+
+
+def tesseract_environment(plan: ResourcePlan):
+    # Tesseract runs as a subprocess and inherits this. It must not be set
+    # before torch loads: OMP_THREAD_LIMIT also caps the in-process OpenMP runtime.
+    os.environ["OMP_THREAD_LIMIT"] = str(plan.tesseract_threads)
+
+
+RESOURCES = plan_resources()
+export_environment(RESOURCES)
@@ -1,71 +1,56 @@
 import pytesseract
 from PIL import Image
-import numpy as np
-import cv2
 from spellchecker import SpellChecker
 from language_tool_python import LanguageTool
-from contextlib import contextmanager
 import re
-import hashlib
-import io
 import os
-from typing import Dict, List
+from typing import Callable, Dict, List, Union
 from ocr_utils import (
     load_dataset,
     build_domain_vocabulary,
     enhance_spellchecker,
     calculate_levenshtein_accuracy,
     calculate_domain_confidence,
-    get_language_tool_instance
+    get_language_tool_instance,
+    language_tool_correct,
+    language_tool_issue_count,
+    term_set
 )
+from page_preprocessing import PreprocessedPage, as_preprocessed
+from resource_config import RESOURCES, tesseract_environment
 
 class TesseractEngine:
-    def __init__(self, vocabulary: Dict[str, List[str]], spell_checker: SpellChecker):
+    def __init__(self, vocabulary: Dict[str, List[str]], spell_checker: SpellChecker,
+                 language_tool_provider: Callable[[], LanguageTool] = get_language_tool_instance):
         pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
+        # TESSERACT_THREADS (default 1): with pages already in parallel,
+        # Tesseract's OpenMP threads only oversubscribe the cores.
+        tesseract_environment(RESOURCES)
         self.vocabulary = vocabulary
         self.spell = spell_checker
-        self.language_tool = get_language_tool_instance()
+        self.language_tool_provider = language_tool_provider
         self.ocr_cache = {}
 
-    @contextmanager
-    def language_tool_context(self):
-        try:
-            yield self.language_tool
-        finally:
-            pass
-    
     def _preprocess(self, image: Image.Image) -> Image.Image:
-        img_np = np.array(image)
-        gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        return Image.fromarray(thresh)
+        return as_preprocessed(image).binary_image()
 
-    def _get_image_hash(self, image: Image.Image) -> str:
-        img_byte_arr = io.BytesIO()
-        if image.mode != 'L':
-            image = image.convert('L')
-        image.save(img_byte_arr, format='PNG') 
-        return hashlib.md5(img_byte_arr.getvalue()).hexdigest()
-
-    def run(self, image: Image.Image) -> str:
-        processed_image = self._preprocess(image)
-        image_hash = self._get_image_hash(processed_image)
+    def run(self, image: Union[Image.Image, PreprocessedPage]) -> str:
+        page = as_preprocessed(image)
+        image_hash = page.digest("binary")
 
         if image_hash in self.ocr_cache:
             return self.ocr_cache[image_hash]
 
-        try:
-            raw_text = pytesseract.image_to_string(processed_image)
-            self.ocr_cache[image_hash] = raw_text
-            return raw_text
-        except Exception as e:
-            print(f"Error during Tesseract processing: {e}")
-            return ""
+        # Failures propagate so the service can count them against the engine.
+        raw_text = pytesseract.image_to_string(page.binary_image())
+        self.ocr_cache[image_hash] = raw_text
+        return raw_text
 
     def correct_spelling(self, text: str) -> str:
-        domain_terms = set()
-        for domain_list in self.vocabulary.values():
-            domain_terms.update(domain_list)
+        return self.correct_grammar(self.spell_correct(text))
+
+    def spell_correct(self, text: str) -> str:
+        domain_term_sets = [term_set(domain_list) for domain_list in self.vocabulary.values()]
 
         words = re.split(r'(\s+)', text)
         corrected_parts = []
@@ -76,7 +61,7 @@ class TesseractEngine:
 
             clean_word = re.sub(r'^\W+|\W+$', '', part).lower()
 
-            if clean_word in domain_terms:
+            if any(clean_word in terms for terms in domain_term_sets):
                 corrected_parts.append(part)
             elif clean_word.isalpha() and len(clean_word) > 2:
                 correction = self.spell.correction(clean_word)
@@ -92,13 +77,13 @@ class TesseractEngine:
             else:
                 corrected_parts.append(part)
 
-        basic_corrected = "".join(corrected_parts)
-        with self.language_tool_context() as lt:
-            return lt.correct(basic_corrected)
+        return "".join(corrected_parts)
+
+    def correct_grammar(self, text: str) -> str:
+        return language_tool_correct(self.language_tool_provider, text)
 
     def check_grammar(self, text: str) -> int:
-        with self.language_tool_context() as lt:
-            return len(lt.check(text))
+        return language_tool_issue_count(self.language_tool_provider, text)
 
     def calculate_accuracy(self, pred: str, truth: str) -> float:
         return calculate_levenshtein_accuracy(pred, truth)
@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+import pytest
+
+from page_preprocessing import MIN_SKEW_DEGREES, PreprocessedPage, estimate_skew_degrees
+
+
+# A blank page with rows of printed words, like a scanned text page.
+def text_page() -> np.ndarray:
+    page = np.full((1100, 850), 255, np.uint8)
+    for y in range(80, 1020, 36):
+        for x in range(70, 780, 60):
+            cv2.putText(page, "word", (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, 0, 2)
+    return page
+
+
+def rotate(gray: np.ndarray, angle: float) -> np.ndarray:
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), borderValue=255)
+
+
+def test_straight_page_is_not_deskewed():
+    page = PreprocessedPage(text_page())
+    page.clean()
+    assert "deskew" not in page.steps
+    assert abs(page.skew_degrees) < MIN_SKEW_DEGREES
+
+
+@pytest.mark.parametrize("tilt", [-6.0, -2.5, 1.5, 4.0])
+def test_deskew_levels_a_tilted_page(tilt):
+    page = PreprocessedPage(rotate(text_page(), tilt))
+    cleaned = page.clean()
+    assert "deskew" in page.steps
+    assert abs(estimate_skew_degrees(cleaned)) < MIN_SKEW_DEGREES